@@ -9,26 +9,33 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import object
 import math
-import random
+import struct
 from functools import reduce
+import numpy as np
 from ._version import __version__
 
 
-def SampleCurves(sample, N=500):
+def SampleCurves(sample, N=500, grid=None):
     """A convenience function which samples random curves and returns (1) a vertically averaged curve
     of all samples, (2) the average of all the areas of these samples, and (3) the unbiased standard
     deviation of the samples. For input, the function requires "sample" to be a callable object which
-    returns randomly sampled Curve objects.
+    returns randomly sampled Curve objects. If a grid of x coordinates is given, the averaged curve is
+    resampled on it, as in Curve.average. The samples are streamed through a CurveAccumulator, so they
+    are never all held in memory.
     """
     assert N >= 1
     assert type(N) == int
-    SUM = Curve([(0, 0), (1, 0)])
     AREA = []
-    for i in range(N):
-        C = sample()
-        SUM += C
-        AREA.append(C.area())
-    curve = SUM.vertical_scale(1.0 / N)
+
+    def samples():
+        for i in range(N):
+            C = sample()
+            AREA.append(C.area())
+            yield C
+
+    A = CurveAccumulator(grid)
+    A.extend(samples())
+    curve = A.average()
     average = reduce(lambda a, b: a + b, AREA) / N
     std_deviation = reduce(lambda a, b: a + b, ((x - average) ** 2 for x in AREA)) / (
         N - 1
@@ -36,52 +43,957 @@ def SampleCurves(sample, N=500):
     return curve, average, std_deviation
 
 
-def BEDROC(scoreddata, alpha):
+def _random_generator(seed=None):
+    """Return a NumPy random generator seeded with seed, which may also be an existing generator."""
+    if isinstance(seed, np.random.RandomState) or hasattr(seed, "bit_generator"):
+        return seed
+    if hasattr(np.random, "default_rng"):
+        return np.random.default_rng(seed)
+    return np.random.RandomState(seed)  # NumPy before 1.17
+
+
+def SampleRandomCurves(scoreddata, curve, transform=None, N=500, seed=None, chunk_size=1 << 22):
+    """A vectorized equivalent of SampleCurves for random curves of a given type (ROC, SlantedAC,
+    CeilingAC or FloorAC), with an optional x-axis transform. It returns the same triple as SampleCurves:
+    the vertically averaged curve, the average area and the unbiased deviation of the areas.
+
+    Instead of building N curves, the sorted positions of the positives in N random rankings are drawn
+    as rows of a matrix, in one call per chunk of rows: each row takes the positions of the P smallest of
+    P + Q uniform random keys, and a chunk holds at most chunk_size keys. The area of each curve is linear in
+    a per-positive term which is looked up from a precomputed table of the transform, and the averaged
+    curve follows from a histogram of all the positions. The seed can be an integer, None or a NumPy
+    random generator.
+
+    >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> curve, average, deviation = SampleRandomCurves(SD, ROC, N=2000, seed=0)
+    >>> abs(average - 0.5) < 0.02, len(curve.x) > 2
+    (True, True)
+    """
+    assert N >= 1
+    assert type(N) == int
+    _unweighted(scoreddata, "SampleRandomCurves")
+    if transform is None:
+        transform = Linear()
+    rng = _random_generator(seed)
+    P = scoreddata.num_pos
+    Q = scoreddata.num_neg
+    total = P + Q
+    D, tables = _position_tables(P, Q, curve, transform)
+
+    AREA = np.empty(N)
+    counts = np.zeros(D + 1)
+    rows = max(1, chunk_size // max(total, 1))
+    for start in range(0, N, rows):
+        K = min(rows, N - start)
+        # The positions of the positives are the P smallest of total uniform keys, drawn for K rankings at once.
+        keys = rng.random((K, total))
+        if 0 < P < total:
+            keys = keys.argpartition(P - 1, axis=1)[:, :P]
+        else:
+            keys = np.broadcast_to(np.arange(P), (K, P))
+        positions = np.sort(keys, axis=1)
+        if curve is ROC:
+            positions -= np.arange(P)  # the number of negatives ranked above each positive
+        AREA[start : start + K] = 1.0 - sum(table[positions].mean(axis=1) for table in tables) / len(tables)
+        counts += np.bincount(positions.ravel(), minlength=D + 1)
+
+    average = float(AREA.mean())
+    std_deviation = float(((AREA - average) ** 2).sum() / (N - 1))
+    return _average_curve(np.cumsum(counts) / N, P, Q, curve, transform), average, std_deviation
+
+
+def RandomCurve(scoreddata, curve, transform=None, grid=None):
+    """The exact counterpart of SampleRandomCurves, which needs no sampling. Returns (1) the expected curve
+    of a given type (ROC, SlantedAC, CeilingAC or FloorAC) under a uniformly random ranking, with an
+    optional x-axis transform, (2) the expected area under the random curves and (3) the variance of
+    these areas.
+
+    The area of a random curve is 1 - mean(g[u]) over the positives, where u is the position of each
+    positive on a grid and g is the transform evaluated on that grid. For AC curves the positions are a
+    simple random sample (without replacement) of the N instances, so the variance carries the finite
+    population correction (N - P) / (N - 1). For ROC curves u counts the negatives ranked above each
+    positive, and the counts of positives at each of the Q + 1 values follow a Bose-Einstein
+    (Dirichlet-multinomial) distribution, which inflates the variance by (P + Q + 1) / (Q + 2).
+
+    >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> curve, average, variance = RandomCurve(SD, ROC)
+    >>> average, round(variance, 12), round(curve.area(), 12)
+    (0.5, 0.036666666667, 0.5)
+    >>> curve, average, variance = RandomCurve(SD, CeilingAC, Exponential(20))
+    >>> round(average, 12), round(variance, 12), round(curve.area(), 12)
+    (0.115651762214, 0.00983226732, 0.115651762214)
+
+    If a grid of x coordinates is given, the expected curve is resampled on it (see Curve.resample).
+
+    >>> RandomCurve(SD, ROC, grid=[0, 0.5, 1])[0]
+    Curve([(0.0, 0.0), (0.0, 0.16666666666666669), (0.5, 0.5), (1.0, 0.8333333333333334), (1.0, 1.0)])
+    """
+    _unweighted(scoreddata, "RandomCurve")
+    if transform is None:
+        transform = Linear()
+    P = scoreddata.num_pos
+    Q = scoreddata.num_neg
+    D, tables = _position_tables(P, Q, curve, transform)
+    g = sum(tables) / len(tables)
+    average = 1.0 - float(g.mean())
+    if curve is ROC:
+        variance = float(g.var()) * (P + Q + 1) / (P * (Q + 2.0))
+    else:
+        variance = float(g.var()) * (D - P) / (P * (D - 1.0))
+    counts = np.full(D + 1, P / float(len(g)))
+    expected = _average_curve(np.cumsum(counts), P, Q, curve, transform)
+    if grid is not None:
+        expected = expected.resample(grid)
+    return expected, average, variance
+
+
+def _unweighted(scoreddata, name):
+    if scoreddata.weighted:
+        raise ValueError("%s does not support weighted data." % name)
+
+
+def _position_tables(P, Q, curve, transform):
+    """The grid on which the positions of the positives in a random ranking are drawn, as the largest
+    position D, and the tables of the transform whose average over the positives determines the area.
+    """
+    if curve is ROC:
+        D = Q
+        grid = _apply(transform, np.arange(D + 1) / float(D))
+        return D, [grid]
+    elif curve in (CeilingAC, FloorAC, SlantedAC):
+        D = P + Q
+        grid = _apply(transform, np.arange(D + 1) / float(D))
+        ceiling, floor = grid[:-1], grid[1:]
+        return D, {CeilingAC: [ceiling], FloorAC: [floor], SlantedAC: [ceiling, floor]}[curve]
+    raise ValueError("curve must be ROC, SlantedAC, CeilingAC or FloorAC.")
+
+
+def _average_curve(TP, P, Q, curve, transform):
+    """Build the vertically averaged curve from the average number of positives TP[j] at positions up
+    to j on the grid of _position_tables."""
+    D = len(TP) - 1
+    if curve is ROC:
+        # TP[j] positives are ranked above the (j + 1)-th negative, on average.
+        FP = np.repeat(np.arange(D + 1.0), 2)
+        sweep = Sweep(np.r_[0.0, np.repeat(TP[:-1], 2), TP[-1]], FP, P, Q)
+    else:
+        k = np.arange(D + 1.0)
+        sweep = Sweep(np.r_[0.0, TP[:-1]], k - np.r_[0.0, TP[:-1]], P, Q)
+    return curve(sweep).transform(transform)
+
+
+def BEDROC(scoreddata, alpha, curves=True):
     """A convenience function which appropriately computes the BEDROC score (and associated curves and
     areas). Output is a dictionary with the relevant data appropriately labeled. For usage examples,
-    please see the croc_bedroc script.
+    please see the croc_bedroc script. The areas of the best and worst curves, which normalize the
+    score, are computed analytically.
+
+    >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> round(BEDROC(SD, 20.0)["BEDROC"], 10)
+    0.8829704486
+
+    Alpha can also be a list, in which case a list with one dictionary per alpha is returned. The data
+    is sorted and swept once, and the areas for all the alphas are computed together as a broadcast
+    over the ranks of the positives. If curves is false, the transformed curves are not constructed.
+
+    >>> [round(out["BEDROC"], 10) for out in BEDROC(SD, [5.0, 20.0], curves=False)]
+    [0.7308591265, 0.8829704486]
+
+    Weighted data is scored from its weighted CeilingAC curve, normalized by the curves with the heaviest
+    positives first and the lightest positives last. Each instance is one step of that curve, as wide as
+    its weight, so integer weights do not give the score of the data with each row repeated.
+
+    >>> W = ScoredData.from_arrays([0.9, 0.8, 0.5, 0.2], [1, 0, 1, 0], weights=[1, 1, 2, 1])
+    >>> out = BEDROC(W, 20.0)
+    >>> round(out["area"], 12) == round(CeilingAC(W.sweep_threshold()).area(Exponential(20.0)), 12)
+    True
+    >>> round(out["BEDROC"], 10)
+    0.5001646602
+    """
+    alphas = np.asarray(alpha, dtype=np.float64).ravel()
+    sweep = scoreddata.sweep_threshold()
+    P = sweep.num_pos
+    N = sweep.num_pos + sweep.num_neg
+
+    if scoreddata.weighted:
+        areas = _exponential_areas(sweep, alphas)
+        max_areas = _exponential_areas(scoreddata.sweep_threshold_best(), alphas)
+        min_areas = _exponential_areas(scoreddata.sweep_threshold_worst(), alphas)
+    else:
+        S = _exponential_rank_sums(sweep, alphas)[0]
+        areas = 1.0 - (P - np.exp(alphas / N) * S) / (P * -np.expm1(-alphas))
+        max_areas = [scoreddata.best_area(CeilingAC, Exponential(a)) for a in alphas.tolist()]
+        min_areas = [scoreddata.worst_area(CeilingAC, Exponential(a)) for a in alphas.tolist()]
+
+    if curves:
+        curve = CeilingAC(sweep)
+        min_curve = CeilingAC(scoreddata.sweep_threshold_worst())
+        max_curve = CeilingAC(scoreddata.sweep_threshold_best())
+
+    results = []
+    for a, area, max_area, min_area in zip(alphas.tolist(), areas.tolist(), max_areas, min_areas):
+        out = {}
+        T = Exponential(a)
+        if curves:
+            out["curve"] = curve.transform(T)
+            out["min_curve"] = min_curve.transform(T)
+            out["max_curve"] = max_curve.transform(T)
+
+        out["area"] = area
+        out["min_area"] = float(min_area)
+        out["max_area"] = float(max_area)
+
+        out["BEDROC"] = (out["area"] - out["min_area"]) / (
+            out["max_area"] - out["min_area"]
+        )
+        results.append(out)
+    return results if np.ndim(alpha) else results[0]
+
+
+def _exponential_rank_sums(sweep, alpha):
+    """The sum of exp(-alpha * r / N) over the 1-indexed ranks r of the positives, along with the same
+    sum when all the positives are ranked at the top and at the bottom of the list. Within smoothed tie
+    groups, each position carries its fractional share of the group's positives. Alpha can be an array,
+    in which case the sums are broadcast over it.
+    """
+    alpha = np.asarray(alpha, dtype=np.float64)
+    P = sweep.num_pos
+    N = sweep.num_pos + sweep.num_neg
+    weights = np.diff(sweep.TP)
+    index = np.flatnonzero(weights)
+    S = np.dot(np.exp(np.multiply.outer(-alpha / N, index + 1.0)), weights[index])
+    block = np.expm1(-alpha * P / N) / np.expm1(-alpha / N)
+    S_max = np.exp(-alpha / N) * block
+    S_min = np.exp(-alpha * (N - P + 1) / N) * block
+    return S, S_max, S_min
+
+
+def _exponential_areas(sweep, alpha):
+    """The areas under the CeilingAC curve of a (possibly weighted) sweep with an exponential transform,
+    broadcast over an array of alphas. Each increment of TP is credited at the fraction of the total
+    weight ranked above it, x, and contributes (1 - T(x)) times its share of the positives."""
+    alpha = np.asarray(alpha, dtype=np.float64)
+    P = sweep.num_pos
+    F = (sweep.TP + sweep.FP) / (sweep.num_pos + sweep.num_neg)
+    weights = np.diff(sweep.TP)
+    index = np.flatnonzero(weights)
+    S = np.dot(np.exp(np.multiply.outer(-alpha, F[index])), weights[index])
+    return 1.0 - (P - S) / (P * -np.expm1(-alpha))
+
+
+def bedroc_score(scores, labels, alpha=20.0):
+    """Compute the BEDROC score straight from arrays of scores and labels with the closed form of
+    Truchon and Bayly, which normalizes the sum of exp(-alpha * r / N) over the ranks r of the positives
+    between its values when the positives are ranked at the bottom and at the top. No curves are built.
+    Ties are handled with the same smooth semantics as the BEDROC function, and the results agree. Alpha
+    can also be an array, in which case an array of scores is returned.
+
+    >>> scores = [0.9, 0.8, 0.8, 0.5, 0.4, 0.4, 0.4, 0.2, 0.1, 0.0]
+    >>> labels = [1, 0, 1, 0, 1, 1, 0, 0, 1, 0]
+    >>> round(bedroc_score(scores, labels, 20.0), 10)
+    0.9313553341
+    >>> round(BEDROC(ScoredData(zip(scores, labels)), 20.0)["BEDROC"], 10)
+    0.9313553341
+    >>> bedroc_score([0.9, 0.1], [0, 0])
+    Traceback (most recent call last):
+        ...
+    AssertionError: There must be at least one positive and one negative example. This data has 0 positive(s) and 2 negative(s).
+    """
+    sweep = Sweep.from_arrays(scores, labels)
+    _check_classes(sweep.num_pos, sweep.num_neg)
+    S, S_max, S_min = _exponential_rank_sums(sweep, alpha)
+    out = (S - S_min) / (S_max - S_min)
+    return out if np.ndim(out) else float(out)
+
+
+def rie_score(scores, labels, alpha=20.0):
+    """Compute the robust initial enhancement (RIE) of Sheridan et al., the sum of exp(-alpha * r / N)
+    over the ranks r of the positives divided by its expected value under a random ranking.
+
+    >>> round(rie_score([3, 2, 1, 0], [1, 0, 0, 0], 1.0), 10)
+    1.399728035
     """
+    sweep = Sweep.from_arrays(scores, labels)
+    _check_classes(sweep.num_pos, sweep.num_neg)
+    out = _rie(sweep, alpha)
+    return out if np.ndim(out) else float(out)
+
+
+def _rie(sweep, alpha):
+    S = _exponential_rank_sums(sweep, alpha)[0]
+    alpha = np.asarray(alpha, dtype=np.float64)
+    N = sweep.num_pos + sweep.num_neg
+    expected = sweep.num_pos / N * -np.expm1(-alpha) / np.expm1(alpha / N)
+    return S / expected
+
+
+def EarlyRecognition(scoreddata, fractions=(0.005, 0.01, 0.02, 0.05), alpha=20.0):
+    """A convenience function which computes the common early recognition metrics from a single sweep
+    of the data, with smoothed ties. Output is a dictionary with:
+
+    * EF: a dictionary of the enrichment factor at each fraction of the list. The number of positives
+      found is interpolated between instances.
+    * ROC_enrichment: a dictionary of the ROC enrichment at each fraction of the negatives, the true
+      positive rate divided by the false positive rate. Where the ROC curve has a vertical step, its top
+      is used.
+    * pROC_AUC: the pROC AUC of Clark and Webster-Clark, the mean of -log10(FPR) over the positives,
+      where FPR is the fraction of negatives ranked above each positive (and at least one negative).
+    * RIE and BEDROC: at the given alpha.
+    * AUC: the area under the ROC curve.
+
+    All the fractions are located at once by binary search in the cumulative counts of the sweep.
+
+    >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> out = EarlyRecognition(SD, fractions=[0.1, 0.2], alpha=20.0)
+    >>> out["EF"], out["ROC_enrichment"]
+    ({0.1: 2.0, 0.2: 1.0}, {0.1: 2.0, 0.2: 4.0})
+    >>> round(out["BEDROC"], 10) == round(BEDROC(SD, 20.0)["BEDROC"], 10), out["AUC"]
+    (True, 0.76)
+    >>> round(out["pROC_AUC"], 10), round(out["RIE"], 10) == round(rie_score(*SD._sort()), 10)
+    (0.6035457534, True)
+    """
+    _unweighted(scoreddata, "EarlyRecognition")
+    sweep = scoreddata.sweep_threshold()
+    P = sweep.num_pos
+    Q = sweep.num_neg
+    fractions = np.asarray(fractions, dtype=np.float64).ravel()
     out = {}
+
+    out["EF"] = dict(zip(fractions.tolist(), np.atleast_1d(_enrichment(sweep, fractions)).tolist()))
+
+    # The top of the ROC curve at FP = f * Q, from the last point with FP <= f * Q.
+    target = fractions * Q
+    i = np.searchsorted(sweep.FP, target, "right") - 1
+    j = np.minimum(i + 1, len(sweep.FP) - 1)
+    inside = sweep.FP[i] < target
+    step = np.where(inside, (target - sweep.FP[i]) / np.where(inside, sweep.FP[j] - sweep.FP[i], 1.0), 0.0)
+    TP = sweep.TP[i] + step * (sweep.TP[j] - sweep.TP[i])
+    out["ROC_enrichment"] = dict(zip(fractions.tolist(), (TP / P / fractions).tolist()))
+
+    out["pROC_AUC"] = _proc_auc(sweep)
+    S, S_max, S_min = _exponential_rank_sums(sweep, alpha)
+    out["RIE"] = float(_rie(sweep, alpha))
+    out["BEDROC"] = float((S - S_min) / (S_max - S_min))
+    out["AUC"] = float(np.dot(np.diff(sweep.FP), sweep.TP[1:] + sweep.TP[:-1])) / (2 * P * Q)
+    return out
+
+
+def _proc_auc(sweep):
+    """The mean over the positives of log10(Q / max(FP, 1)), where FP is the number of negatives ranked
+    above each positive. Inside smoothed tie groups, each positive is spread evenly over the range of FP
+    of its group, and the mean is integrated exactly."""
+    P = sweep.num_pos
+    Q = sweep.num_neg
+    weight = np.diff(sweep.TP)
+    a = sweep.FP[:-1]
+    b = sweep.FP[1:]
+
+    def H(u):
+        # The integral of log10(Q / max(v, 1)) for v from 0 to u.
+        big = np.maximum(u, 1.0)
+        return u * math.log10(Q) - (big * np.log(big) - big + 1.0) / math.log(10)
+
+    width = b - a
+    flat = width == 0
+    mean = np.where(flat, math.log10(Q) - np.log10(np.maximum(a, 1.0)), 0.0)
+    mean[~flat] = (H(b[~flat]) - H(a[~flat])) / width[~flat]
+    return float(np.dot(weight, mean) / P)
+
+
+def roc_auc(scores, labels):
+    """Compute the area under the ROC curve straight from arrays of scores and labels, as the Mann-Whitney
+    U statistic of the positives divided by the number of positive-negative pairs. Tied scores get their
+    average rank, which gives half credit to tied pairs and matches the smooth tie handling of
+    sweep_threshold. Only one argsort is needed and no curve is built. Twice the rank sum is an exact
+    integer, so the result is correctly rounded.
+
+    >>> scores = [0.9, 0.8, 0.8, 0.5, 0.4, 0.4, 0.4, 0.2, 0.1, 0.0]
+    >>> labels = [1, 0, 1, 0, 1, 1, 0, 0, 1, 0]
+    >>> roc_auc(scores, labels)
+    0.62
+    >>> round(ROC(ScoredData(zip(scores, labels)).sweep_threshold()).area(), 12)
+    0.62
+    """
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    labels = np.asarray(labels).ravel() != 0
+    assert scores.shape == labels.shape
+    twice_u, P, Q = _twice_mann_whitney(scores, labels)
+    _check_classes(P, Q)
+    return twice_u / (2 * P * Q)
+
+
+def _check_classes(num_pos, num_neg):
+    if num_pos == 0 or num_neg == 0:
+        raise AssertionError(
+            "There must be at least one positive and one negative example. This data has %i positive(s) and %i negative(s)."
+            % (num_pos, num_neg)
+        )
+
+
+def _twice_mann_whitney(scores, labels):
+    """Twice the Mann-Whitney U statistic of the positives (an exact integer), along with the numbers of
+    positives and negatives."""
+    n = len(scores)
+    P = int(np.count_nonzero(labels))
+    if n == 0:
+        return 0, 0, 0
+    order = np.argsort(scores, kind="mergesort")
+    scores = scores[order]
+    labels = labels[order]
+    starts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    size = np.diff(np.r_[starts, n])
+    pos = np.add.reduceat(labels.astype(np.int64), starts)
+    # The 1-indexed ranks of a group starting at index a span a + 1 to a + size, so twice their average
+    # is 2 * a + size + 1.
+    twice_rank_sum = int(np.dot(pos, 2 * starts + size + 1))
+    return twice_rank_sum - P * (P + 1), P, n - P
+
+
+def BootstrapAreas(scoreddata, curve, transform=None, B=1000, seed=None, workers=1, chunk_size=1 << 22):
+    """Bootstrap the area under a curve of a given type (ROC, SlantedAC, CeilingAC or FloorAC), with an
+    optional x-axis transform, and return an array of the B resampled areas. Positives and negatives are
+    resampled separately, so every resample has the same number of each (a stratified bootstrap).
+
+    The data is sorted once and grouped by tied scores. A resample is then fully described by the number
+    of positives and negatives drawn in each group, which are multinomial counts, and the smooth tie
+    handling applies to each resampled group. The resamples are drawn as rows of count matrices (in
+    chunks of about chunk_size elements), and their areas are computed with cumulative sums over the
+    rows. Each chunk has its own random stream spawned from the seed, so the result only depends on the
+    seed, and the chunks can be spread over several worker processes.
+
+    >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> areas = BootstrapAreas(SD, ROC, B=2000, seed=0, chunk_size=5000)
+    >>> len(areas), bool(abs(areas.mean() - ROC(SD.sweep_threshold()).area()) < 0.02)
+    (2000, True)
+    >>> np.array_equal(areas, BootstrapAreas(SD, ROC, B=2000, seed=0, workers=2, chunk_size=5000))
+    True
+    """
+    assert B >= 1
+    _unweighted(scoreddata, "BootstrapAreas")
+    if transform is None:
+        transform = Linear()
+    if curve not in (ROC, CeilingAC, FloorAC, SlantedAC):
+        raise ValueError("curve must be ROC, SlantedAC, CeilingAC or FloorAC.")
+    scores, labels = scoreddata._sort()
+    pos, neg = _score_groups(scores, labels)
+    N = len(scores)
+    # The AC curves have fixed x coordinates k / N, so the transform is only evaluated once.
+    table = transform if curve is ROC else _apply(transform, np.arange(N + 1) / float(N))
+
+    rows = max(1, chunk_size // (N + 1))
+    sizes = [min(rows, B - start) for start in range(0, B, rows)]
+    seeds = _spawn_seeds(seed, len(sizes))
+    tasks = [(pos, neg, size, child, curve, table) for size, child in zip(sizes, seeds)]
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(min(workers, len(tasks))) as executor:
+            return np.concatenate(list(executor.map(_bootstrap_chunk, tasks)))
+    return np.concatenate([_bootstrap_chunk(task) for task in tasks])
+
+
+def BootstrapBEDROC(scoreddata, alpha, B=1000, seed=None, workers=1, chunk_size=1 << 22):
+    """Bootstrap the BEDROC score, and return an array of the B resampled scores. See BootstrapAreas.
+
+    >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> low, high = confidence_interval(BootstrapBEDROC(SD, 20.0, seed=0))
+    >>> low < BEDROC(SD, 20.0)["BEDROC"] < high
+    True
+    """
     T = Exponential(alpha)
-    out["curve"] = CeilingAC(scoreddata.sweep_threshold()).transform(T)
-    out["min_curve"] = CeilingAC(scoreddata.sweep_threshold_worst()).transform(T)
-    out["max_curve"] = CeilingAC(scoreddata.sweep_threshold_best()).transform(T)
+    areas = BootstrapAreas(scoreddata, CeilingAC, T, B, seed, workers, chunk_size)
+    low = scoreddata.worst_area(CeilingAC, T)
+    high = scoreddata.best_area(CeilingAC, T)
+    return (areas - low) / (high - low)
 
-    out["area"] = out["curve"].area()
-    out["min_area"] = out["min_curve"].area()
-    out["max_area"] = out["max_curve"].area()
 
-    out["BEDROC"] = (out["area"] - out["min_area"]) / (
-        out["max_area"] - out["min_area"]
-    )
-    return out
+def confidence_interval(values, level=0.95):
+    """The percentile interval which holds the central fraction (level) of the bootstrapped values.
+
+    >>> confidence_interval(np.arange(101.0), 0.5)
+    (25.0, 75.0)
+    """
+    assert 0 < level < 1
+    low, high = np.percentile(values, [50 * (1 - level), 50 * (1 + level)])
+    return float(low), float(high)
+
+
+def _spawn_seeds(seed, n):
+    if hasattr(np.random, "SeedSequence"):
+        return np.random.SeedSequence(seed).spawn(n)
+    return np.random.RandomState(seed).randint(0, 2 ** 31 - 1, size=n).tolist()  # NumPy before 1.17
+
+
+def _score_groups(scores, labels):
+    """The number of positives and negatives in each group of tied scores of sorted data."""
+    starts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    size = np.diff(np.r_[starts, len(scores)])
+    pos = np.add.reduceat(labels.astype(np.int64), starts)
+    return pos, size - pos
+
+
+def _bootstrap_chunk(task):
+    pos, neg, size, seed, curve, table = task
+    rng = _random_generator(seed)
+    P = pos.sum()
+    Q = neg.sum()
+    sampled_pos = rng.multinomial(P, pos / float(P), size=size)
+    sampled_neg = rng.multinomial(Q, neg / float(Q), size=size)
+    return _group_areas(sampled_pos, sampled_neg, curve, table)
+
+
+def _group_areas(pos, neg, curve, table):
+    """The areas under the curves of several datasets, given as rows of the number of positives and
+    negatives in each group of tied scores (in decreasing order). All the rows must have the same
+    number of positives and negatives. Inside each group, the counts are smoothed as in
+    Sweep.from_arrays. For AC curves, table holds the transform on the grid k / N, and for ROC curves
+    it is the transform itself.
+
+    >>> SD = ScoredData([(0.9, 1), (0.8, 1), (0.8, 0), (0.5, 0), (0.5, 0), (0.5, 1), (0.1, 0)])
+    >>> pos, neg = _score_groups(*SD._sort())
+    >>> T = Exponential(3)
+    >>> round(float(_group_areas(pos[None], neg[None], ROC, T)[0]), 12), round(ROC(SD.sweep_threshold()).transform(T).area(), 12)
+    (0.635680542449, 0.635680542449)
+    """
+    rows, G = pos.shape
+    m = pos + neg
+    P = float(pos[0].sum())
+    Q = float(neg[0].sum())
+    N = int(m[0].sum())
+
+    # Find the group of the k-th ranked instance of every row with one search over the flattened rows.
+    end = np.cumsum(m, axis=1)
+    k = np.arange(1, N + 1)
+    offsets = np.arange(rows)[:, None] * (N + 1)
+    index = np.searchsorted((end + offsets).ravel(), (k + offsets).ravel())
+    before = (np.cumsum(pos, axis=1) - pos).ravel()[index]
+    start = (end - m).ravel()[index]
+    TP = np.zeros((rows, N + 1))
+    TP[:, 1:] = (before + pos.ravel()[index] * (np.tile(k, rows) - start) / m.ravel()[index]).reshape(rows, N)
+
+    if curve is ROC:
+        FP = k - TP[:, 1:]
+        x = np.zeros((rows, N + 1))
+        x[:, 1:] = _apply(table, (FP / Q).ravel()).reshape(rows, N)
+        return (np.diff(x, axis=1) * (TP[:, 1:] + TP[:, :-1])).sum(axis=1) / (2 * P)
+    width = np.diff(table)
+    ceiling = np.dot(TP[:, 1:], width) / P
+    floor = np.dot(TP[:, :-1], width) / P
+    if curve is CeilingAC:
+        return ceiling
+    elif curve is FloorAC:
+        return floor
+    return (ceiling + floor) / 2
+
+
+_CHUNK_SIZE = 1 << 24
+
+_MAGIC = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "lzma"),
+]
+
+
+def _peek(stream, n):
+    if hasattr(stream, "peek"):
+        return stream.peek(n)[:n]
+    if hasattr(stream, "seekable") and stream.seekable():
+        position = stream.tell()
+        head = stream.read(n)
+        stream.seek(position)
+        return head
+    return b""
+
+
+def _binary_input(file):
+    """Return a binary stream for a file path or an open (text or binary) stream, transparently
+    decompressing gzip, bz2 and xz input. The second item returned is true if the stream was opened
+    here and should be closed by the caller.
+    """
+    opened = False
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        file = open(file, "rb")
+        opened = True
+    elif hasattr(file, "buffer") and hasattr(file, "encoding"):
+        file = file.buffer  # the binary stream underneath a text stream like sys.stdin
+
+    try:
+        head = _peek(file, 6)
+    except (TypeError, ValueError):
+        head = b""  # a text stream without a binary buffer (e.g. StringIO)
+    if isinstance(head, bytes):
+        for magic, module in _MAGIC:
+            if head.startswith(magic):
+                if module == "gzip":
+                    import gzip
+
+                    return gzip.GzipFile(fileobj=file, mode="rb"), True
+                elif module == "bz2":
+                    import bz2
+
+                    return bz2.BZ2File(file), True
+                else:
+                    import lzma
+
+                    return lzma.LZMAFile(file), True
+    return file, opened
+
+
+def _read_chunks(file, chunk_size=_CHUNK_SIZE):
+    """Read a file in large chunks which end on line boundaries. Yields each chunk (as bytes) along with
+    the (1-indexed) line number of its first line.
+    """
+    stream, opened = _binary_input(file)
+    try:
+        line = 1
+        rest = b""
+        while True:
+            chunk = stream.read(chunk_size)
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                break
+            chunk = rest + chunk
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                rest = chunk
+                continue
+            chunk, rest = chunk[:end], chunk[end:]
+            yield chunk, line
+            line += chunk.count(b"\n")
+        if rest.strip():
+            yield rest, line
+    finally:
+        if opened:
+            stream.close()
+
+
+def _tokens_per_line(chunk):
+    """Count the whitespace delimited tokens on each line of a chunk, vectorized over its bytes."""
+    b = np.frombuffer(chunk, dtype=np.uint8)
+    space = np.r_[True, b <= 32]
+    starts = space[:-1] > space[1:]
+    newlines = np.flatnonzero(b == 10)
+    bounds = np.r_[0, newlines + 1]
+    bounds = bounds[bounds < len(b)]
+    return np.add.reduceat(starts, bounds) if len(bounds) else np.zeros(0, dtype=np.int64)
+
+
+def _parse_numbers(chunk, dtype):
+    """Parse all whitespace delimited numbers in a chunk, or return None if any token is not a number.
+    The float conversion in NumPy, one token at a time, bounds the speed of reading text files, so files
+    which are read repeatedly are better converted once to the binary format (see write_binary)."""
+    import warnings
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        try:
+            return np.fromstring(chunk, dtype=dtype, sep=" ")
+        except (ValueError, DeprecationWarning):
+            return None
+
+
+def _malformed(chunk, line, convert, message):
+    """Locate the first line of a chunk with a token that cannot be converted, and raise a ValueError
+    which reports it."""
+    for i, text in enumerate(chunk.split(b"\n")):
+        for token in text.split():
+            try:
+                convert(token)
+            except ValueError:
+                raise ValueError(
+                    "line %i: %s, found %r" % (line + i, message, text.decode("utf-8", "replace"))
+                )
+    raise ValueError("line %i: %s" % (line, message))
+
+
+def _read_columns(file, columns, message, integers=()):
+    """Read a whitespace delimited text file with a fixed number of numeric columns into a float64
+    array with one row per (non-blank) line. The columns listed in integers must hold integral values.
+    Malformed lines are reported with their line numbers.
+    """
+    out = _Buffer(np.float64)
+    for rows in _iter_columns(file, columns, message, integers):
+        out.extend(rows)
+    return out.view().reshape(-1, columns)
+
+
+def _iter_columns(file, columns, message, integers=()):
+    """Like _read_columns, but yields the rows of each chunk of the file as a separate array, so large
+    files can be processed incrementally."""
+    for chunk, line in _read_chunks(file):
+        counts = _tokens_per_line(chunk)
+        bad = np.flatnonzero((counts != columns) & (counts != 0))
+        if len(bad) == 0:
+            values = _parse_numbers(chunk, np.float64)
+            if values is None or len(values) != counts.sum():
+                _malformed(chunk, line, float, message)
+            rows = values.reshape(-1, columns)
+            for c in integers:
+                rows_bad = np.flatnonzero(rows[:, c] != np.trunc(rows[:, c]))
+                if len(rows_bad):
+                    bad = np.flatnonzero(counts)[rows_bad[:1]]
+        if len(bad):
+            text = chunk.split(b"\n")[bad[0]].decode("utf-8", "replace")
+            raise ValueError("line %i: %s, found %r" % (line + bad[0], message, text))
+        yield values.reshape(-1, columns)
+
+
+_BINARY_MAGIC = b"CROCSD\x00\x01"
+_BINARY_HEADER = struct.Struct("<8sQQQ")  # magic, number of instances, number of positives, flags
+_BINARY_OFFSET = 64
+_BINARY_SORTED = 1
+_BINARY_WEIGHTED = 2
+
+
+def _binary_padding(num):
+    """The size of the label column of a weighted binary file, padded so the weights are aligned."""
+    return -(-num // 8) * 8
+
+
+def _is_path(file):
+    return isinstance(file, (str, bytes)) or hasattr(file, "__fspath__")
+
+
+def _read_binary_header(head):
+    if len(head) < _BINARY_OFFSET:
+        raise ValueError("truncated binary scored data header")
+    magic, num, num_pos, flags = _BINARY_HEADER.unpack(head[: _BINARY_HEADER.size])
+    if magic != _BINARY_MAGIC:
+        raise ValueError("not a binary scored data file")
+    assert num_pos <= num
+    return num, num_pos, flags
+
+
+def _read_integers(file):
+    """Read all whitespace delimited integers of a text file into an int64 array."""
+    out = _Buffer(np.int64)
+    for chunk, line in _read_chunks(file):
+        values = _parse_numbers(chunk, np.int64)
+        if values is None or len(values) != _tokens_per_line(chunk).sum():
+            _malformed(chunk, line, int, "expected only integers")
+        out.extend(values)
+    return out.view()
 
 
 class ScoredData(object):
+    """Paired scores and labels stored column-wise in growable float64 and uint8 arrays. The columns are
+    sorted in place (by decreasing score) the first time the data is swept, and the tie statistics are
+    cached until more data is added.
+
+    Instances can also carry non-negative weights (for example, to correct for redundant chemotypes or to
+    reweight the classes), which are stored in a third float64 column. Unweighted data has no weight
+    column at all. The counts num, num_pos and num_neg are always the numbers of instances, while the
+    sweeps accumulate weights, so the curves and BEDROC of weighted data are computed without
+    duplicating any rows. The ROC and SlantedAC curves of integer weights are those of the data with
+    each row repeated, while the stepped AC curves (and BEDROC) take each instance as one step as wide as
+    its weight, which keeps them independent of the scale of the weights.
+
+    >>> SD = ScoredData.from_arrays([0.9, 0.5, 0.2], [1, 0, 1], weights=[2, 1, 1])
+    >>> SD.weighted, SD.num_pos
+    (True, 2)
+    >>> SD.sweep_threshold().TP
+    array([0., 2., 2., 3.])
+    >>> D = ScoredData([(0.9, 1), (0.9, 1), (0.5, 0), (0.2, 1)])
+    >>> ROC(SD.sweep_threshold()) == ROC(D.sweep_threshold())
+    True
+
+    So weights are not a drop-in replacement for repeated rows in the CeilingAC and FloorAC areas or
+    BEDROC, which only match the repeated rows for unit weights.
+
+    >>> CeilingAC(SD.sweep_threshold()).area(), CeilingAC(D.sweep_threshold()).area()
+    (0.75, 0.6666666666666666)
+    """
+
     def __init__(self, scored_labels=[]):
         """The base constructor for this class which takes as input a list of 2-tuples representing
         paired scores (as floats where larger scores mean more likely to be positive) and labels
         (1 or 0 with 1 being the positive class).
         """
         self.num = self.num_pos = self.num_neg = 0
-        self.score_labels = {}
-        self._score_label = {}
-        self.nummixed = 0
-        for S, L in scored_labels:
-            self.add(S, L)
+        self._scores = _Buffer(np.float64)
+        self._labels = _Buffer(np.uint8)
+        self._weights = None
+        self._sorted = True
+        self._ties = None
+        scored_labels = list(scored_labels)
+        if scored_labels:
+            self.extend(
+                [S for S, L in scored_labels], [1 if not not L else 0 for S, L in scored_labels]
+            )
 
     def __eq__(self, other):
-        return self.score_labels.__eq__(other.score_labels)
+        """Two datasets are equal if they have the same scores, with the labels of tied scores in the same order.
+
+        >>> ScoredData([(1, 1), (0, 0)]) == ScoredData([(0, 0), (1, 1)])
+        True
+        >>> ScoredData([(1, 1), (1, 0)]) == ScoredData([(1, 0), (1, 1)])
+        False
+        """
+        if self.num != other.num:
+            return False
+        scores, labels = self._sort()
+        other_scores, other_labels = other._sort()
+        return bool(
+            np.array_equal(scores, other_scores)
+            and np.array_equal(labels, other_labels)
+            and np.array_equal(self._weight_column(), other._weight_column())
+        )
 
     @staticmethod
-    def read_from_file(file):
+    def from_arrays(scores, labels, weights=None):
+        """An alternate constructor which takes as input an array of scores and an array of labels, and
+        optionally an array of weights. Any non-zero label is counted as a positive.
+
+        >>> SD = ScoredData.from_arrays([0.2, 0.7, 0.4], [0, 1, 1])
+        >>> SD.num_pos, SD.num_neg
+        (2, 1)
+        """
+        SD = ScoredData()
+        SD.extend(scores, labels, weights)
+        return SD
+
+    @staticmethod
+    def read_from_file(file, weighted=False):
         """An alternate constructor which reads data from a file. The file format is white space delimited
-        text file with the first column the score and the second column the label.
+        text file with the first column the score and the second column the label. The file can be given
+        as a path or an open stream, and may be compressed with gzip, bz2 or xz. It is parsed in large
+        chunks straight into the columnar arrays.
+
+        >>> from io import StringIO
+        >>> SD = ScoredData.read_from_file(StringIO('0.5 1\\n0.2 0\\n0.9 0\\n'))
+        >>> SD.num_pos, SD.num_neg
+        (1, 2)
+
+        Malformed lines are reported with their line number.
+
+        >>> ScoredData.read_from_file(StringIO('0.5 1\\n0.2\\n'))
+        Traceback (most recent call last):
+            ...
+        ValueError: line 2: expected a score and an integer label, found '0.2'
+
+        Files in the binary format written by write_binary are detected and read with read_binary, also
+        when they are compressed (compressed files are read into memory rather than memory mapped).
+
+        >>> import gzip, tempfile, os
+        >>> directory = tempfile.mkdtemp()
+        >>> SD = ScoredData([(0.2, 0), (0.9, 1), (0.5, 0)])
+        >>> SD.write_binary(os.path.join(directory, "toy.scored-binary"))
+        >>> with open(os.path.join(directory, "toy.scored-binary"), "rb") as raw:
+        ...     with gzip.open(os.path.join(directory, "toy.scored-binary.gz"), "wb") as compressed:
+        ...         _ = compressed.write(raw.read())
+        >>> ScoredData.read_from_file(os.path.join(directory, "toy.scored-binary.gz")) == SD
+        True
+
+        If weighted is true, a text file has a third column with the weight of each instance.
+
+        >>> SD = ScoredData.read_from_file(StringIO('0.5 1 2.5\\n0.2 0 1\\n'), weighted=True)
+        >>> SD.sweep_threshold().TP
+        array([0. , 2.5, 2.5])
         """
+        if _is_path(file):
+            with open(file, "rb") as stream:
+                binary = stream.read(len(_BINARY_MAGIC)) == _BINARY_MAGIC
+            if binary:
+                return ScoredData.read_binary(file)
+            # A compressed binary file is only recognized after decompression, and is read as a stream.
+            stream, opened = _binary_input(file)
+            try:
+                if _peek(stream, len(_BINARY_MAGIC)) == _BINARY_MAGIC:
+                    return ScoredData.read_binary(stream)
+            finally:
+                if opened:
+                    stream.close()
+        else:
+            stream, opened = _binary_input(file)
+            try:
+                head = _peek(stream, len(_BINARY_MAGIC))
+            except (TypeError, ValueError):
+                head = b""
+            if head == _BINARY_MAGIC:
+                return ScoredData.read_binary(stream)
+            file = stream
+        if weighted:
+            data = _read_columns(file, 3, "expected a score, an integer label and a weight", integers=(1,))
+            return ScoredData.from_arrays(data[:, 0], data[:, 1], data[:, 2])
+        data = _read_columns(file, 2, "expected a score and an integer label", integers=(1,))
+        labels = data[:, 1]
+        return ScoredData.from_arrays(data[:, 0], labels)
+
+    def write_binary(self, file):
+        """Write the data to a file (given as a path or a binary stream) in a compact binary format: a 64
+        byte header followed by the scores as a little-endian float64 column and the labels as a uint8
+        column. The header holds the number of instances and positives, and a flag which records that the
+        data is sorted. The data is sorted before it is written, so files can be swept without sorting.
+        The weights of weighted data follow the labels as a float64 column (aligned to 8 bytes), and are
+        recorded by another flag.
+
+        >>> import tempfile, os
+        >>> path = os.path.join(tempfile.mkdtemp(), "toy.scored-binary")
+        >>> SD = ScoredData([(0.2, 0), (0.9, 1), (0.5, 0), (0.5, 1)])
+        >>> SD.write_binary(path)
+        >>> SD2 = ScoredData.read_binary(path)
+        >>> SD2 == SD, SD2.num_pos, SD2.num_neg, ScoredData.read_from_file(path) == SD
+        (True, 2, 2, True)
+        >>> list(SD2.sweep_threshold()) == list(SD.sweep_threshold())
+        True
+        """
+        scores, labels = self._sort()
+        flags = _BINARY_SORTED | (_BINARY_WEIGHTED if self.weighted else 0)
+        header = _BINARY_HEADER.pack(_BINARY_MAGIC, self.num, self.num_pos, flags)
+        stream = open(file, "wb") if _is_path(file) else file
+        try:
+            stream.write(header.ljust(_BINARY_OFFSET, b"\x00"))
+            stream.write(scores.astype("<f8").tobytes())
+            stream.write(labels.view(np.uint8).tobytes())
+            if self.weighted:
+                stream.write(b"\x00" * (_binary_padding(self.num) - self.num))
+                stream.write(self._weights.view().astype("<f8").tobytes())
+        finally:
+            if stream is not file:
+                stream.close()
+
+    @staticmethod
+    def read_binary(file):
+        """An alternate constructor which reads a file in the binary format of write_binary. Files given
+        as paths are memory mapped (read-only) straight into the columns, without copying or parsing, so
+        processes reading the same file share its pages. Sorted files are not sorted again. Streams are
+        read into memory.
+        """
+        weights = None
+        if _is_path(file):
+            with open(file, "rb") as stream:
+                num, num_pos, flags = _read_binary_header(stream.read(_BINARY_OFFSET))
+            if num:
+                scores = np.memmap(file, dtype="<f8", mode="r", offset=_BINARY_OFFSET, shape=(num,))
+                labels = np.memmap(
+                    file, dtype=np.uint8, mode="r", offset=_BINARY_OFFSET + 8 * num, shape=(num,)
+                )
+                if flags & _BINARY_WEIGHTED:
+                    offset = _BINARY_OFFSET + 8 * num + _binary_padding(num)
+                    weights = np.memmap(file, dtype="<f8", mode="r", offset=offset, shape=(num,))
+        else:
+            num, num_pos, flags = _read_binary_header(file.read(_BINARY_OFFSET))
+            size = 8 * num + (_binary_padding(num) + 8 * num if flags & _BINARY_WEIGHTED else num)
+            data = file.read(size)
+            if len(data) != size:
+                raise ValueError("truncated binary scored data file")
+            scores = np.frombuffer(data, dtype="<f8", count=num)
+            labels = np.frombuffer(data, dtype=np.uint8, offset=8 * num, count=num)
+            if flags & _BINARY_WEIGHTED:
+                weights = np.frombuffer(data, dtype="<f8", offset=8 * num + _binary_padding(num))
+
         SD = ScoredData()
-        for line in file:
-            S, L = line.split()
-            SD.add(float(S), int(L))
+        if num:
+            SD._scores.assign(scores)
+            SD._labels.assign(labels)
+            if weights is not None:
+                SD._weights = _Buffer(np.float64, weights)
+            SD._sorted = bool(flags & _BINARY_SORTED)
+        SD.num = int(num)
+        SD.num_pos = int(num_pos)
+        SD.num_neg = int(num - num_pos)
         return SD
 
     @staticmethod
@@ -90,9 +1002,9 @@ class ScoredData(object):
         The first integer should be N, the total number of positive and negative instances. The rest of
         the integers should be the ranks of the positive instances.
         """
-        data = [int(R) for R in (" ".join(file.readlines())).split()]
+        data = _read_integers(file)
         ranks = data[1:]
-        N = data[0]
+        N = int(data[0])
         return ScoredData.from_ranks1(ranks, N)
 
     @staticmethod
@@ -101,9 +1013,9 @@ class ScoredData(object):
         The first integer should be N, the total number of positive and negative instances. The rest of
         the integers should be the ranks of the positive instances.
         """
-        data = [int(R) for R in (" ".join(file.readlines())).split()]
+        data = _read_integers(file)
         ranks = data[1:]
-        N = data[0]
+        N = int(data[0])
         return ScoredData.from_ranks0(ranks, N)
 
     @staticmethod
@@ -112,28 +1024,43 @@ class ScoredData(object):
         Scores are fixed at the negative of the 0-indexed rank of each instance. Ties are not
         allowed in this constructor. N is the total number of negative and positive instances.
         """
-        return ScoredData.from_ranks0([R - 1 for R in positive_ranks], N)
+        return ScoredData.from_ranks0(np.asarray(positive_ranks) - 1, N)
 
     @staticmethod
     def from_ranks0(positive_ranks, N):
         """An alternate constructor which takes as input the 0-indexed ranks of all the positive instances.
         Scores are fixed at the negative of the 0-indexed rank of each instance. Ties are not
         allowed in this constructor. N is the total number of negative and positive instances.
-        """
-        for R in positive_ranks:
-            assert R >= 0
-            assert R < N
-            assert int(R) == R
 
-        ranks = set(positive_ranks)
-        assert len(ranks) == len(positive_ranks)  # No ties allowed in this constructor!
+        The ranks can be any sequence or NumPy array of integers. The labels are built by scattering ones
+        into an all-negative label array, and the data is already sorted, so no sort is needed later.
 
-        scored_labels = [(-n, 1 if n in positive_ranks else 0) for n in range(N)]
+        >>> SD = ScoredData.from_ranks0(np.array([0, 2]), 4)
+        >>> SD.num_pos, SD.num_neg, SD.mixed_tie_count()
+        (2, 2, 0)
+        >>> ScoredData.from_ranks0([1, 1], 4)
+        Traceback (most recent call last):
+            ...
+        AssertionError
+        """
+        ranks = np.asarray(positive_ranks).ravel()
+        assert np.all(ranks >= 0)
+        assert np.all(ranks < N)
+        assert np.all(ranks == np.trunc(ranks))
 
-        return ScoredData(scored_labels)
+        labels = np.zeros(N, dtype=np.uint8)
+        labels[ranks.astype(np.int64)] = 1
+        assert np.count_nonzero(labels) == len(ranks)  # No ties allowed in this constructor!
 
-    def add(self, score, label):
+        SD = ScoredData.from_arrays(-np.arange(N, dtype=np.float64), labels)
+        SD._sorted = True
+        return SD
+
+    def add(self, score, label, weight=None):
         """Preferred method to add score-label pairs to instance"""
+        if weight is not None or self._weights is not None:
+            self.extend([score], [label], None if weight is None else [weight])
+            return
         label = 1 if not not label else 0
         self.num_pos += label
         self.num_neg += 1 - label
@@ -141,27 +1068,100 @@ class ScoredData(object):
 
         assert self.num_pos + self.num_neg == self.num
 
-        self.score_labels[score] = self.score_labels.get(score, [])
-        score_labels = self.score_labels[score]
-        score_labels.append(label)
-
-        if len(score_labels) == 1:
-            self._score_label[score] = label
-        elif label != self._score_label[score]:
-            self._score_label[score] = "mixed"
-            self.nummixed += 1
+        self._scores.append(score)
+        self._labels.append(label)
+        self._sorted = False
+        self._ties = None
+
+    def extend(self, scores, labels, weights=None):
+        """Add arrays of scores and labels (and optionally weights) to this instance in bulk. Once any
+        weights are given, the instances without weights have a weight of one."""
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(labels).ravel() != 0
+        assert scores.shape == labels.shape
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            assert weights.shape == scores.shape
+            assert np.all(weights >= 0)
+            if self._weights is None:
+                self._weights = _Buffer(np.float64, np.ones(self.num))
+        if self._weights is not None and len(scores):
+            self._weights.extend(np.ones(len(scores)) if weights is None else weights)
+
+        num_pos = int(np.count_nonzero(labels))
+        self.num_pos += num_pos
+        self.num_neg += len(labels) - num_pos
+        self.num += len(labels)
+
+        if len(scores):
+            self._scores.extend(scores)
+            self._labels.extend(labels)
+            self._sorted = False
+            self._ties = None
+
+    @property
+    def score_labels(self):
+        """A dictionary mapping each score to the list of its labels, in the order they were added."""
+        scores, labels = self._sort()
+        out = {}
+        for S, L in zip(scores.tolist(), labels.tolist()):
+            out.setdefault(S, []).append(L)
+        return out
+
+    @property
+    def weighted(self):
+        """True if the instances carry weights."""
+        return self._weights is not None
+
+    def _sort(self):
+        """Sort the columns in place by decreasing score, keeping ties in the order they were presented,
+        and return the scores along with a boolean view of the labels."""
+        if not self._sorted:
+            scores = self._scores.view()
+            order = np.argsort(-scores, kind="mergesort")
+            self._scores.assign(scores[order])
+            self._labels.assign(self._labels.view()[order])
+            if self._weights is not None:
+                self._weights.assign(self._weights.view()[order])
+            self._sorted = True
+        return self._scores.view(), self._labels.view().view(np.bool_)
+
+    def _weight_column(self):
+        """The weights in sorted order, or None for unweighted data."""
+        self._sort()
+        return None if self._weights is None else self._weights.view()
+
+    def _mixed_ties(self):
+        if self._ties is None:
+            self._ties = _mixed_ties(*self._sort())
+        return self._ties
 
     def mixed_tie_count(self):
-        """Returns the number of scores associated with instances with different labels."""
-        return self.nummixed
+        """Returns the number of scores associated with instances with different labels. Each such score
+        is counted once, however many instances share it (earlier versions also counted every instance
+        added after a score became mixed, which over-counted).
+
+        >>> ScoredData([(1, 1), (1, 0), (0, 0), (0, 0)]).mixed_tie_count()
+        1
+        >>> ScoredData([(1, 1), (1, 0), (1, 0), (1, 1)]).mixed_tie_count()
+        1
+        """
+        return len(self._mixed_ties()[0])
 
     def sweep_threshold(self, tie_mode="smooth"):
-        """An iterater that yields TP, TN, FP, FN with a threshold at infinity and gradually sweeping down to
-        negative infinity. Ties can be handeled in several ways:
+        """Returns a Sweep of the TP, TN, FP, FN with a threshold at infinity and gradually sweeping down to
+        negative infinity. Iterating over the sweep yields these counts as tuples. Ties can be handeled in
+        several ways:
 
         * smooth (preferred) - construct a smooth slanted line which interpolates the TP, TN, FP, and FN appropriately
         * ignore - output the instances in the order they were presented to the ScoredData instance.
         * sample - randomly shuffle the ties.
+
+        >>> SD = ScoredData([(0.5, 1), (0.5, 0), (0.2, 0)])
+        >>> list(SD.sweep_threshold())
+        [(0, 2, 0, 1), (0.5, 1.5, 0.5, 0.5), (1, 1, 1, 0), (1, 0, 2, 0)]
+        >>> list(SD.sweep_threshold(tie_mode="ignore"))
+        [(0, 2, 0, 1), (1, 2, 0, 0), (1, 1, 1, 0), (1, 0, 2, 0)]
         """
         if self.num_pos == 0 or self.num_neg == 0:
             raise AssertionError(
@@ -169,120 +1169,804 @@ class ScoredData(object):
                 % (self.num_pos, self.num_neg)
             )
 
-        # from sympy import Rational
-        # from sympy import cache
-        from fractions import Fraction as Rational
+        tie_mode = _tie_mode(tie_mode)
+        scores, labels = self._sort()
+        weights = self._weight_column()
+        if tie_mode == "smooth":
+            return Sweep._from_sorted(scores, labels, self._mixed_ties(), weights)
+        if tie_mode == "sample":
+            order = np.lexsort((np.random.random(self.num), -scores))
+            return Sweep._from_sorted(scores[order], labels[order], None, _take(weights, order))
+        return Sweep._from_sorted(scores, labels, None, weights)
+
+    def sweep_threshold_best(self):
+        """Equivalent to the sweep_threshold method, but assumes all the positives are ranked at the top of the list.
+        With weights, the heaviest positives are ranked first, which gives the largest early recognition
+        (such as the area under an exponentially transformed CeilingAC curve)."""
+        if self.weighted:
+            return self._extreme_sweep(True)
+        k = np.arange(self.num + 1, dtype=np.float64)
+        TP = np.minimum(k, self.num_pos)
+        return Sweep(TP, k - TP)
+
+    def sweep_threshold_worst(self):
+        """Equivalent to the sweep_threshold method, but assumes all the positives are ranked at the bottom of the list.
+        With weights, the lightest positives are ranked first among them."""
+        if self.weighted:
+            return self._extreme_sweep(False)
+        k = np.arange(self.num + 1, dtype=np.float64)
+        FP = np.minimum(k, self.num_neg)
+        return Sweep(k - FP, FP)
+
+    def _extreme_sweep(self, best):
+        scores, labels = self._sort()
+        weights = self._weight_column()
+        # Positives sorted by decreasing (best) or increasing (worst) weight, before (best) or after the negatives.
+        key = -weights if best else weights
+        order = np.lexsort((key, labels != best))
+        return Sweep._from_sorted(scores, labels[order], None, weights[order])
+
+    def sweep_threshold_random(self):
+        """Equivalent to the sweep_threshold method, but randomly shuffles the positives throughout the list."""
+        if self.weighted:
+            scores, labels = self._sort()
+            order = np.random.permutation(self.num)
+            return Sweep._from_sorted(scores, labels[order], None, self._weight_column()[order])
+        labels = np.zeros(self.num, dtype=bool)
+        labels[np.random.permutation(self.num)[: self.num_pos]] = True
+        return Sweep._from_sorted(np.zeros(self.num), labels)
+
+    def best_area(self, curve, transform=None):
+        """The area under the best possible curve of a given type (ROC, SlantedAC, CeilingAC or FloorAC)
+        with an optional x-axis transform. The area is computed analytically and memoized, so it costs
+        nothing to compute more than once for the same number of positives and negatives.
+
+        >>> SD = ScoredData.from_ranks1([2, 5, 6], 10)
+        >>> T = Exponential(20)
+        >>> round(SD.best_area(CeilingAC, T), 12)
+        0.384550306107
+        >>> round(CeilingAC(SD.sweep_threshold_best()).transform(T).area(), 12)
+        0.384550306107
+
+        For weighted data, the area is computed from the (transformed) curve of sweep_threshold_best. Unit
+        weights give the same areas as unweighted data.
+
+        >>> U = ScoredData.from_arrays(*SD._sort(), weights=np.ones(SD.num))
+        >>> all(abs(U.best_area(c, T) - SD.best_area(c, T)) < 1e-12 and
+        ...     abs(U.worst_area(c, T) - SD.worst_area(c, T)) < 1e-12
+        ...     for c in (ROC, SlantedAC, CeilingAC, FloorAC))
+        True
+        """
+        if self.weighted:
+            C = curve(self.sweep_threshold_best())
+            if transform is not None:
+                C = C.transform(transform)
+            return C.area()
+        return _extreme_area(self.num_pos, self.num_neg, curve, transform, True)
+
+    def worst_area(self, curve, transform=None):
+        """The area under the worst possible curve of a given type, analogous to best_area.
+
+        >>> SD = ScoredData.from_ranks1([2, 5, 6], 10)
+        >>> round(SD.worst_area(FloorAC), 12), round(FloorAC(SD.sweep_threshold_worst()).area(), 12)
+        (0.1, 0.1)
+        """
+        if self.weighted:
+            C = curve(self.sweep_threshold_worst())
+            if transform is not None:
+                C = C.transform(transform)
+            return C.area()
+        return _extreme_area(self.num_pos, self.num_neg, curve, transform, False)
+
+
+class GroupedScoredData(object):
+    """Scored labels from many groups (for example, the targets of a virtual screen) held in one table.
+    The rows are sorted once, with a single stable sort on (group, decreasing score), so every group is
+    a contiguous, sorted segment of the columns. The ROC AUC and BEDROC scores of all the groups are
+    computed together with segment operations over these columns, and each group is also available as
+    a ScoredData (sharing the sorted columns) for any other evaluation.
+
+    >>> G = GroupedScoredData.from_arrays(["b", "a", "b", "a", "b", "a"], [0.9, 0.8, 0.1, 0.4, 0.5, 0.6], [1, 1, 0, 0, 0, 1])
+    >>> G.keys
+    ['a', 'b']
+    >>> G["a"].num_pos, G["b"].num_neg
+    (2, 2)
+    >>> G.roc_auc()
+    {'a': 1.0, 'b': 1.0}
+    >>> [round(x, 10) for x in G.bedroc(20.0).values()] == [round(BEDROC(S, 20.0)["BEDROC"], 10) for key, S in G]
+    True
+    """
+
+    def __init__(self, keys, groups, scores, labels):
+        """Construct from a sorted list of keys and the row columns, where groups holds the index of the
+        key of each row."""
+        groups = np.asarray(groups, dtype=np.int64).ravel()
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(labels).ravel() != 0
+        assert groups.shape == scores.shape == labels.shape
+        order = np.lexsort((-scores, groups))
+        self.keys = list(keys)
+        self._index = dict((key, i) for i, key in enumerate(self.keys))
+        self._groups = groups[order]
+        self._scores = scores[order]
+        self._labels = labels[order]
+        K = len(self.keys)
+        self._starts = np.searchsorted(self._groups, np.arange(K + 1))
+        self.num = np.diff(self._starts)
+        self.num_pos = np.bincount(self._groups, weights=self._labels, minlength=K).astype(np.int64)
+        self.num_neg = self.num - self.num_pos
+
+    @staticmethod
+    def from_arrays(groups, scores, labels):
+        """An alternate constructor which takes arrays of group keys, scores and labels."""
+        keys, index = np.unique(np.asarray(groups), return_inverse=True)
+        return GroupedScoredData(keys.tolist(), index, scores, labels)
+
+    @staticmethod
+    def read_from_file(file):
+        """An alternate constructor which reads a white space delimited text file with three columns: a
+        group key (any token without white space), a score and a label. Like ScoredData.read_from_file,
+        the file can be a path or a stream, possibly compressed, and is parsed in large chunks.
+
+        >>> from io import StringIO
+        >>> G = GroupedScoredData.read_from_file(StringIO('t1 0.5 1\\nt2 0.2 0\\nt1 0.9 0\\nt2 0.4 1\\n'))
+        >>> G.keys, G.num.tolist(), G.num_pos.tolist()
+        (['t1', 't2'], [2, 2], [1, 1])
+        """
+        message = "expected a group, a score and an integer label"
+        index = {}
+        groups = _Buffer(np.int64)
+        scores = _Buffer(np.float64)
+        labels = _Buffer(np.float64)
+        for chunk, line in _read_chunks(file):
+            counts = _tokens_per_line(chunk)
+            bad = np.flatnonzero((counts != 3) & (counts != 0))
+            if len(bad) == 0:
+                tokens = np.array(chunk.split()).reshape(-1, 3)
+                try:
+                    values = tokens[:, 1:].astype(np.float64)
+                    bad = np.flatnonzero(values[:, 1] != np.trunc(values[:, 1]))[:1]
+                except ValueError:
+                    bad = [i for i, row in enumerate(tokens[:, 1:].tolist()) if not _numeric(row)][:1]
+                bad = np.flatnonzero(counts)[bad]
+            if len(bad):
+                text = chunk.split(b"\n")[bad[0]].decode("utf-8", "replace")
+                raise ValueError("line %i: %s, found %r" % (line + bad[0], message, text))
+            keys, inverse = np.unique(tokens[:, 0], return_inverse=True)
+            ids = np.array([index.setdefault(k.decode("utf-8"), len(index)) for k in keys.tolist()])
+            groups.extend(ids[inverse.ravel()])
+            scores.extend(values[:, 0])
+            labels.extend(values[:, 1])
+
+        keys = sorted(index)
+        rank = np.zeros(len(index), dtype=np.int64)
+        rank[[index[k] for k in keys]] = np.arange(len(keys))
+        return GroupedScoredData(keys, rank[groups.view()], scores.view(), labels.view())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, key):
+        """The data of one group as a ScoredData, which is already sorted. Keys are found in a dictionary,
+        so looking up every group takes linear time."""
+        return self._group(self._index[key])
 
-        def smooth_ties(ties):
-            sum = 0
-            for t in ties:
-                sum += t
-            return [Rational(sum, len(ties))] * len(ties)
+    def __iter__(self):
+        """Iterate over (key, ScoredData) pairs, in the order of the keys."""
+        for i, key in enumerate(self.keys):
+            yield key, self._group(i)
 
-        def ignore_ties(ties):
-            return ties
+    def _group(self, i):
+        a, b = self._starts[i], self._starts[i + 1]
+        SD = ScoredData()
+        SD._scores.assign(self._scores[a:b])
+        SD._labels.assign(self._labels[a:b].view(np.uint8))
+        SD.num = int(b - a)
+        SD.num_pos = int(self.num_pos[i])
+        SD.num_neg = int(self.num_neg[i])
+        return SD
 
-        def sample_ties(ties):
-            return random.sample(ties, len(ties))
+    def _runs(self):
+        """The start, size, number of positives and group of each run of tied scores within a group."""
+        scores = self._scores
+        groups = self._groups
+        n = len(scores)
+        start = np.flatnonzero(np.r_[True, (scores[1:] != scores[:-1]) | (groups[1:] != groups[:-1])])
+        size = np.diff(np.r_[start, n])
+        pos = np.add.reduceat(self._labels.astype(np.int64), start) if n else start
+        return start, size, pos, groups[start]
+
+    def roc_auc(self):
+        """The ROC AUC (with smoothed ties) of every group, as a dictionary. Each positive counts the
+        negatives ranked below it, and half of those tied with it. Groups without both positives and
+        negatives have an AUC of nan."""
+        start, size, pos, group = self._runs()
+        K = len(self.keys)
+        negatives = np.r_[0, np.cumsum(~self._labels)]
+        before = negatives[start] - negatives[self._starts[group]]
+        below = self.num_neg[group] - before - (size - pos)
+        twice = np.bincount(group, weights=pos * (2 * below + size - pos), minlength=K)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = twice / (2.0 * self.num_pos * self.num_neg)
+        return dict(zip(self.keys, out.tolist()))
+
+    def bedroc(self, alpha=20.0):
+        """The BEDROC score (with smoothed ties) of every group, as a dictionary. The sum of
+        exp(-alpha * r / N) over the ranks of the positives is accumulated one run of tied scores at a
+        time, as a geometric series weighted by the fraction of positives in the run. Groups without
+        both positives and negatives have a score of nan."""
+        start, size, pos, group = self._runs()
+        K = len(self.keys)
+        N = self.num.astype(np.float64)
+        P = self.num_pos
+        a = start - self._starts[group]
+        n = N[group]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            block = np.exp(-alpha * (a + 1) / n) * np.expm1(-alpha * size / n) / np.expm1(-alpha / n)
+            S = np.bincount(group, weights=pos / size.astype(np.float64) * block, minlength=K)
+            top = np.expm1(-alpha * P / N) / np.expm1(-alpha / N)
+            S_max = np.exp(-alpha / N) * top
+            S_min = np.exp(-alpha * (N - P + 1) / N) * top
+            out = (S - S_min) / (S_max - S_min)
+        out[(P == 0) | (P == N)] = np.nan
+        return dict(zip(self.keys, out.tolist()))
+
+    def evaluate(self, function, workers=1):
+        """Apply a function to the ScoredData of every group, and return a dictionary of the results. With
+        more than one worker, the groups are evaluated in a pool of processes (so the function must be
+        picklable, like a function defined at the top level of a module).
+
+        >>> G = GroupedScoredData.from_arrays([1, 1, 2, 2], [0.5, 0.2, 0.3, 0.9], [1, 0, 1, 0])
+        >>> G.evaluate(ScoredData.mixed_tie_count)
+        {1: 0, 2: 0}
+        """
+        if workers > 1 and len(self.keys) > 1:
+            from concurrent.futures import ProcessPoolExecutor
 
-        if tie_mode == 1 or tie_mode == "smooth":
-            tie_mode = smooth_ties
-        elif tie_mode == 0 or tie_mode == "ignore":
-            tie_mode = ignore_ties
-        elif tie_mode == 2 or tie_mode == "sample":
-            tie_mode = sample_ties
+            with ProcessPoolExecutor(min(workers, len(self.keys))) as executor:
+                results = list(executor.map(function, [S for key, S in self]))
         else:
-            raise ValueError(
-                "tie_mode must equal 'smooth_ties', 'ignore_ties', or 'sample_ties'."
+            results = [function(S) for key, S in self]
+        return dict(zip(self.keys, results))
+
+
+def _numeric(tokens):
+    try:
+        for token in tokens:
+            float(token)
+        return True
+    except ValueError:
+        return False
+
+
+class IncrementalScoredData(object):
+    """Scored labels which arrive continuously, for monitoring a model as it runs. The instances are kept
+    sorted (by decreasing score, with ties in the order they arrived) in a list of sorted chunks of about
+    chunk_size instances, so adding or evicting k instances only touches the chunks they fall in, in
+    O(k log k + log N + chunk_size) time, and the data is never sorted again.
+
+    Each chunk caches the cumulative count of its positives, and the chunk totals are cached as running
+    sums, so the number of positives and negatives ranked above any score is found by binary search.
+    This keeps twice the Mann-Whitney U statistic up to date (as an exact integer) through every change,
+    so the ROC AUC is always available in constant time. For BEDROC and the curves, the scoreddata method
+    joins the sorted chunks into a sorted ScoredData in a single linear pass, which is cached until the
+    next change.
+
+    If a window is given, only the most recent window instances are kept, and older instances are
+    evicted as new ones arrive. Instances can also be evicted explicitly, oldest first.
+
+    >>> I = IncrementalScoredData(window=4)
+    >>> I.extend([0.9, 0.4, 0.6], [1, 0, 1])
+    >>> I.roc_auc()
+    1.0
+    >>> I.extend([0.8, 0.7], [0, 1])
+    >>> I.num, I.num_pos, I.roc_auc()
+    (4, 2, 0.5)
+    >>> I.scoreddata() == ScoredData([(0.4, 0), (0.6, 1), (0.8, 0), (0.7, 1)])
+    True
+    >>> round(BEDROC(I.scoreddata(), 20.0)["BEDROC"], 10) == round(bedroc_score([0.4, 0.6, 0.8, 0.7], [0, 1, 0, 1]), 10)
+    True
+    """
+
+    def __init__(self, window=None, chunk_size=4096):
+        assert window is None or window >= 1
+        assert chunk_size >= 4
+        self.window = window
+        self.chunk_size = chunk_size
+        self.num = self.num_pos = self.num_neg = 0
+        # Chunks of negated scores (so each is sorted in increasing order), arrival numbers and labels.
+        self._keys = []
+        self._seqs = []
+        self._labels = []
+        self._cum = []
+        # Negated scores and labels in the order they arrived, from arrival number self._base.
+        self._arrival_keys = _Buffer(np.float64)
+        self._arrival_labels = _Buffer(np.uint8)
+        self._base = self._head = self._next = 0
+        self._twice_u = 0
+        self._data = None
+        self._summarize()
+
+    def add(self, score, label):
+        self.extend([score], [label])
+
+    def extend(self, scores, labels):
+        """Add arrays of scores and labels, which arrive after all the instances already added."""
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(labels).ravel() != 0
+        assert scores.shape == labels.shape
+        k = len(scores)
+        if k == 0:
+            return
+        keys = -scores
+        self._twice_u += self._cross(keys, labels) + _twice_mann_whitney(scores, labels)[0]
+        self._insert(keys, self._next + np.arange(k), labels)
+        self._arrival_keys.extend(keys)
+        self._arrival_labels.extend(labels)
+        self._next += k
+        num_pos = int(np.count_nonzero(labels))
+        self._count(k, num_pos)
+        if self.window is not None and self.num > self.window:
+            self.evict(self.num - self.window)
+
+    def evict(self, count):
+        """Remove the count oldest instances (or all of them, if there are fewer)."""
+        count = min(int(count), self.num)
+        if count <= 0:
+            return
+        first = self._head - self._base
+        keys = self._arrival_keys.view()[first : first + count].copy()
+        labels = self._arrival_labels.view()[first : first + count].view(np.bool_).copy()
+        self._head += count
+        self._remove(keys)
+        self._count(-count, -int(np.count_nonzero(labels)))
+        self._twice_u -= self._cross(keys, labels) + _twice_mann_whitney(-keys, labels)[0]
+
+        # Drop the evicted arrivals once they make up most of the buffer.
+        first += count
+        if first > len(self._arrival_keys) // 2:
+            self._arrival_keys.assign(self._arrival_keys.view()[first:].copy())
+            self._arrival_labels.assign(self._arrival_labels.view()[first:].copy())
+            self._base = self._head
+
+    def roc_auc(self):
+        """The ROC AUC (with smoothed ties) of the current instances."""
+        if self.num_pos == 0 or self.num_neg == 0:
+            raise AssertionError(
+                "There must be at least one positive and one negative example. This data has %i positive(s) and %i negative(s)."
+                % (self.num_pos, self.num_neg)
             )
+        return self._twice_u / (2 * self.num_pos * self.num_neg)
+
+    def scoreddata(self):
+        """The current instances as a ScoredData, which is already sorted."""
+        if self._data is None:
+            SD = ScoredData()
+            if self._keys:
+                SD._scores.assign(-np.concatenate(self._keys))
+                SD._labels.assign(np.concatenate(self._labels).view(np.uint8))
+            SD.num = self.num
+            SD.num_pos = self.num_pos
+            SD.num_neg = self.num_neg
+            self._data = SD
+        return self._data
 
-        TP = FP = 0
-        TN = self.num_neg
-        FN = self.num_pos
-
-        yield TP, TN, FP, FN
-
-        SCORES = list(self.score_labels.items())
-        SCORES.sort()
-        SCORES.reverse()
-
-        for S, Ls in SCORES:
-            if self._score_label[S] == "mixed":
-                Ls = tie_mode(Ls)
-            for L in Ls:
-                # if type(L) == int: L = Rational(L)
-                TP += L
-                FP += 1 - L
-                FN -= L
-                TN -= 1 - L
-                if int(TP) == TP:
-                    TP = int(TP)
-                    FP = int(FP)
-                    FN = int(FN)
-                    TN = int(TN)
-                    yield TP, TN, FP, FN
-                else:
-                    yield float(TP), float(TN), float(
-                        FP
-                    ), float(FN)
+    def sweep_threshold(self, tie_mode="smooth"):
+        return self.scoreddata().sweep_threshold(tie_mode)
+
+    def _count(self, num, num_pos):
+        self.num += num
+        self.num_pos += num_pos
+        self.num_neg += num - num_pos
+        self._data = None
+
+    def _summarize(self):
+        """Cache the first and last key of each chunk, and the numbers of instances and positives before it."""
+        self._firsts = np.array([keys[0] for keys in self._keys])
+        self._lasts = np.array([keys[-1] for keys in self._keys])
+        self._offsets = np.cumsum([0] + [len(keys) for keys in self._keys])
+        self._pos_offsets = np.cumsum([0] + [int(cum[-1]) for cum in self._cum])
+
+    def _ranks(self, keys, side):
+        """The numbers of instances and positives with a key less than (side="left") or at most
+        (side="right") each of the keys."""
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        n = np.full(len(keys), self.num, dtype=np.int64)
+        p = np.full(len(keys), self.num_pos, dtype=np.int64)
+        # Every chunk before the first one with a last key at or above (or above) a key lies below it.
+        chunk = np.searchsorted(self._lasts, keys, side)
+        for c, a, b in _runs_of(chunk):
+            if c < len(self._keys):
+                j = np.searchsorted(self._keys[c], keys[a:b], side)
+                n[a:b] = self._offsets[c] + j
+                p[a:b] = self._pos_offsets[c] + self._cum[c][j]
+        out_n = np.empty_like(n)
+        out_p = np.empty_like(p)
+        out_n[order] = n
+        out_p[order] = p
+        return out_n, out_p
+
+    def _cross(self, keys, labels):
+        """Twice the number of pairs between the given instances and the current ones (which exclude
+        them) where the positive is ranked above the negative, with ties counted once."""
+        n_below, p_below = self._ranks(keys, "left")
+        n_upto, p_upto = self._ranks(keys, "right")
+        q_below = n_below - p_below
+        q_upto = n_upto - p_upto
+        # A positive is ranked above the negatives with larger keys; a negative below the positives with smaller keys.
+        positive = 2 * (self.num_neg - q_upto) + (q_upto - q_below)
+        negative = 2 * p_below + (p_upto - p_below)
+        return int(np.where(labels, positive, negative).sum())
+
+    def _set_chunk(self, c, keys, seqs, labels):
+        """Replace chunk c with the given sorted columns, split into pieces of chunk_size if it is too large
+        or dropped if it is empty. Returns the number of chunks it became."""
+        size = len(keys)
+        if size > 2 * self.chunk_size:
+            n = -(-size // self.chunk_size)
+            pieces = [(i * size // n, (i + 1) * size // n) for i in range(n)]
+        else:
+            pieces = [(0, size)] if size else []
+        self._keys[c : c + 1] = [keys[a:b] for a, b in pieces]
+        self._seqs[c : c + 1] = [seqs[a:b] for a, b in pieces]
+        self._labels[c : c + 1] = [labels[a:b] for a, b in pieces]
+        self._cum[c : c + 1] = [_cumulative_count(labels[a:b]) for a, b in pieces]
+        return len(pieces)
+
+    def _insert(self, keys, seqs, labels):
+        order = np.argsort(keys, kind="stable")
+        keys, seqs, labels = keys[order], seqs[order], labels[order]
+        if not self._keys:
+            self._keys, self._seqs, self._labels, self._cum = [keys], [seqs], [labels], [None]
+            self._set_chunk(0, keys, seqs, labels)
+        else:
+            # Each instance goes after the ties which arrived before it, into the first chunk with a larger last key.
+            chunk = np.minimum(np.searchsorted(self._lasts, keys, "right"), len(self._keys) - 1)
+            for c, a, b in _runs_of(chunk)[::-1]:
+                j = np.searchsorted(self._keys[c], keys[a:b], "right")
+                # The new instances land at positions j + i of the merged chunk.
+                new = j + np.arange(b - a)
+                old = np.ones(len(self._keys[c]) + b - a, dtype=bool)
+                old[new] = False
+                columns = []
+                for column, values in ((self._keys, keys), (self._seqs, seqs), (self._labels, labels)):
+                    merged = np.empty(len(old), dtype=values.dtype)
+                    merged[new] = values[a:b]
+                    merged[old] = column[c]
+                    columns.append(merged)
+                self._set_chunk(c, *columns)
+        self._summarize()
+
+    def _remove(self, keys):
+        """Remove the instances which arrived before self._head, whose keys are given."""
+        # An instance lies in one of the chunks whose range of keys holds its key.
+        low = np.searchsorted(self._lasts, keys, "left")
+        high = np.searchsorted(self._firsts, keys, "right")
+        touched = np.zeros(len(self._keys) + 1, dtype=np.int64)
+        np.add.at(touched, low, 1)
+        np.add.at(touched, high, -1)
+        chunks = np.flatnonzero(np.cumsum(touched)[:-1] > 0)
+        for c in chunks[::-1].tolist():
+            keep = self._seqs[c] >= self._head
+            self._set_chunk(c, self._keys[c][keep], self._seqs[c][keep], self._labels[c][keep])
+        self._merge()
+        self._summarize()
+
+    def _merge(self):
+        """Merge chunks which have shrunk below a quarter of chunk_size into their successors."""
+        c = 0
+        while c < len(self._keys) - 1:
+            if len(self._keys[c]) < self.chunk_size // 4:
+                self._set_chunk(
+                    c + 1,
+                    np.concatenate(self._keys[c : c + 2]),
+                    np.concatenate(self._seqs[c : c + 2]),
+                    np.concatenate(self._labels[c : c + 2]),
+                )
+                del self._keys[c], self._seqs[c], self._labels[c], self._cum[c]
+            else:
+                c += 1
 
-        assert TN == 0
-        assert FN == 0
-        # cache.clear_cache()
 
-    def sweep_threshold_best(self):
-        """Equivalent to the sweep_threshold method, but assumes all the positives are ranked at the top of the list."""
-        TP = FP = 0.0
-        TN = self.num_neg
-        FN = self.num_pos
-        yield TP, TN, FP, FN
-
-        for L in [1] * self.num_pos + [0] * self.num_neg:
-            TP += L
-            FP += 1 - L
-            FN -= L
-            TN -= 1 - L
-            yield TP, TN, FP, FN
-
-        assert TN == 0
-        assert FN == 0
+def _runs_of(values):
+    """The (value, start, end) of each run of equal values in a sorted integer array."""
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]]) if len(values) else values
+    ends = np.r_[starts[1:], len(values)]
+    return list(zip(values[starts].tolist(), starts.tolist(), ends.tolist()))
 
-    def sweep_threshold_worst(self):
-        """Equivalent to the sweep_threshold method, but assumes all the positives are ranked at the bottom of the list."""
-        TP = FP = 0.0
-        TN = self.num_neg
-        FN = self.num_pos
-        yield TP, TN, FP, FN
-
-        for L in [0] * self.num_neg + [1] * self.num_pos:
-            TP += L
-            FP += 1 - L
-            FN -= L
-            TN -= 1 - L
-            yield TP, TN, FP, FN
-
-        assert TN == 0
-        assert FN == 0
 
-    def sweep_threshold_random(self):
-        """Equivalent to the sweep_threshold method, but randomly shuffles the positives throughout the list."""
-        TP = FP = 0.0
-        TN = self.num_neg
-        FN = self.num_pos
-        yield TP, TN, FP, FN
+def _cumulative_count(labels):
+    """The number of positives among the first i labels, for i from 0 to len(labels)."""
+    out = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(labels, out=out[1:])
+    return out
+
+
+class TopRanked(object):
+    """Evaluates the top of the ranking of a stream of scored labels in bounded memory. Only the k highest
+    scores (along with any scores tied with the k-th) and their labels are kept, while the total numbers
+    of positives and negatives are counted. Data can be added in chunks with extend or read from a file,
+    one chunk at a time, with read_from_file.
+
+    The beginning of the sweep, and so the beginning of every curve, is exact (including smoothed ties),
+    as are the enrichment factors at the top of the list. The BEDROC score also depends on the ranks of
+    the positives below the top, which are only known to lie somewhere in the rest of the list, so it is
+    returned as an interval. For large alphas, this interval is very narrow.
+
+    >>> T = TopRanked(4)
+    >>> T.extend([0.9, 0.1, 0.8, 0.3, 0.7, 0.6, 0.2], [1, 0, 0, 1, 1, 0, 0])
+    >>> T.num, T.num_pos, len(T.scores)
+    (7, 3, 4)
+    >>> T.sweep().TP
+    array([0., 1., 1., 2., 2.])
+    >>> CeilingAC(T.sweep())
+    Curve([(0.0, 0.0), (0.0, 0.3333333333333333), (0.2857142857142857, 0.3333333333333333), (0.2857142857142857, 0.6666666666666666), (0.5714285714285714, 0.6666666666666666)])
+    """
+
+    def __init__(self, k):
+        assert k >= 1
+        self.k = k
+        self.num = self.num_pos = self.num_neg = 0
+        self.scores = np.zeros(0)
+        self.labels = np.zeros(0, dtype=bool)
+
+    @staticmethod
+    def read_from_file(file, k):
+        """Read a scored-label file (see ScoredData.read_from_file), keeping only its top k scores."""
+        T = TopRanked(k)
+        for rows in _iter_columns(file, 2, "expected a score and an integer label", integers=(1,)):
+            T.extend(rows[:, 0], rows[:, 1])
+        return T
+
+    def add(self, score, label):
+        self.extend([score], [label])
+
+    def extend(self, scores, labels):
+        """Add arrays of scores and labels, and drop the scores which fall below the top k."""
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(labels).ravel() != 0
+        assert scores.shape == labels.shape
+        num_pos = int(np.count_nonzero(labels))
+        self.num_pos += num_pos
+        self.num_neg += len(labels) - num_pos
+        self.num += len(labels)
+
+        scores = np.concatenate((self.scores, scores))
+        labels = np.concatenate((self.labels, labels))
+        if len(scores) > self.k:
+            # Everything tied with the k-th highest score is kept, so the tie groups at the top are complete.
+            threshold = np.partition(scores, len(scores) - self.k)[len(scores) - self.k]
+            keep = scores >= threshold
+            scores = scores[keep]
+            labels = labels[keep]
+        self.scores = scores
+        self.labels = labels
+
+    def sweep(self):
+        """The beginning of the sweep (see ScoredData.sweep_threshold), over the top scores, with smoothed
+        ties. The totals of the sweep are those of the whole stream."""
+        order = np.argsort(-self.scores, kind="mergesort")
+        scores = self.scores[order]
+        labels = self.labels[order]
+        S = Sweep._from_sorted(scores, labels, _mixed_ties(scores, labels))
+        return Sweep(S.TP, S.FP, self.num_pos, self.num_neg)
+
+    def enrichment(self, fraction):
+        """The enrichment factor at a fraction of the list (or an array of fractions): the fraction of
+        the positives found in the top of the list divided by the fraction of the list. The number of
+        positives is interpolated between instances. Fractions beyond the top scores raise ValueError.
+
+        >>> T = TopRanked(4)
+        >>> T.extend([0.9, 0.1, 0.8, 0.3, 0.7, 0.6, 0.2, 0.0], [1, 0, 0, 1, 1, 0, 0, 0])
+        >>> T.enrichment(0.25), T.enrichment(0.125)
+        (1.3333333333333333, 2.6666666666666665)
+        """
+        sweep = self.sweep()
+        return _enrichment(sweep, fraction, len(sweep) - 1)
+
+    def bedroc(self, alpha=20.0):
+        """The lower and upper bounds of the BEDROC score, which are reached when the positives below the
+        top scores are all at the bottom, or all right below the top, of the list.
+
+        >>> SD = ScoredData.from_ranks1([1, 3, 4, 5, 8, 40, 90], 100)
+        >>> T = TopRanked(10)
+        >>> T.extend(*SD._sort())
+        >>> [round(x, 6) for x in T.bedroc(20.0)], round(BEDROC(SD, 20.0)["BEDROC"], 6)
+        ([0.701365, 0.760586], 0.701463)
+        >>> [round(x, 6) for x in T.bedroc(100.0)], round(BEDROC(SD, 100.0)["BEDROC"], 6)
+        ([0.761989, 0.762028], 0.761989)
+        """
+        sweep = self.sweep()
+        P = self.num_pos
+        N = self.num
+        top = len(sweep) - 1
+        S, S_max, S_min = _exponential_rank_sums(sweep, alpha)
+        rest = int(round(P - sweep.TP[-1]))
+        low = S + _exponential_block(N - rest + 1, rest, alpha, N)
+        high = S + _exponential_block(top + 1, rest, alpha, N)
+        return float((low - S_min) / (S_max - S_min)), float((high - S_min) / (S_max - S_min))
+
+
+def _exponential_block(first, count, alpha, N):
+    """The sum of exp(-alpha * r / N) over the count ranks r starting at first."""
+    return math.exp(-alpha * first / N) * math.expm1(-alpha * count / N) / math.expm1(-alpha / N)
+
+
+def _enrichment(sweep, fraction, top=None):
+    """The enrichment factor of a sweep at fractions of the list, interpolating TP between instances.
+    If top is given, only the first top instances of the list are known."""
+    fraction = np.asarray(fraction, dtype=np.float64)
+    N = sweep.num_pos + sweep.num_neg
+    position = fraction * N
+    if top is not None and np.any(position > top):
+        raise ValueError("the enrichment is only known within the top %i instances" % top)
+    assert np.all((fraction > 0) & (fraction <= 1))
+    TP = np.interp(position, np.arange(len(sweep.TP)), sweep.TP)
+    out = TP / sweep.num_pos / fraction
+    return out if np.ndim(out) else float(out)
+
+
+def _tie_mode(tie_mode):
+    if tie_mode == 1 or tie_mode == "smooth":
+        return "smooth"
+    elif tie_mode == 0 or tie_mode == "ignore":
+        return "ignore"
+    elif tie_mode == 2 or tie_mode == "sample":
+        return "sample"
+    raise ValueError(
+        "tie_mode must equal 'smooth_ties', 'ignore_ties', or 'sample_ties'."
+    )
+
+
+def _mixed_ties(scores, labels):
+    """Find the groups of tied scores with both positive and negative labels in sorted data. Returns
+    arrays of the start index, size and number of positives of each mixed group."""
+    n = len(scores)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    size = np.diff(np.r_[starts, n])
+    pos = np.add.reduceat(labels.astype(np.int64), starts)
+    mixed = (pos > 0) & (pos < size)
+    return starts[mixed], size[mixed], pos[mixed]
+
+
+class Sweep(object):
+    """The cumulative true positive (TP) and false positive (FP) counts of a threshold sweeping from
+    infinity down to negative infinity. TP[k] and FP[k] are float64 arrays holding the counts after the
+    k top ranked instances, so both arrays have one more element than there are instances.
+
+    The true negative and false negative counts follow from the totals. Iterating over a sweep yields
+    (TP, TN, FP, FN) tuples, with integer counts wherever TP is integral.
+
+    >>> S = Sweep.from_arrays([0.9, 0.1, 0.5], [1, 0, 0])
+    >>> S.TP, S.FP
+    (array([0., 1., 1., 1.]), array([0., 0., 1., 2.]))
+    >>> list(S)
+    [(0, 2, 0, 1), (1, 2, 0, 0), (1, 1, 1, 0), (1, 0, 2, 0)]
+    """
+
+    def __init__(self, TP, FP, num_pos=None, num_neg=None):
+        self.TP = np.asarray(TP, dtype=np.float64)
+        self.FP = np.asarray(FP, dtype=np.float64)
+        assert self.TP.shape == self.FP.shape and self.TP.ndim == 1
+        self.num_pos = float(self.TP[-1]) if num_pos is None else num_pos
+        self.num_neg = float(self.FP[-1]) if num_neg is None else num_neg
+
+    @staticmethod
+    def from_arrays(scores, labels, tie_mode="smooth", weights=None):
+        """Construct a sweep from arrays of scores and labels with a stable argsort and cumulative
+        sums. Tie groups are detected as runs of equal scores in the sorted order. In the smooth tie
+        mode, the counts inside a tie group with m instances and p positives are interpolated in closed
+        form: after the j-th instance of the group, TP has grown by p * j / m.
 
-        labels = [0] * self.num_neg + [1] * self.num_pos
-        random.shuffle(labels)
+        >>> Sweep.from_arrays([1, 1, 1, 0], [1, 0, 0, 0]).TP
+        array([0.        , 0.33333333, 0.66666667, 1.        , 1.        ])
 
-        for L in labels:
-            TP += L
-            FP += 1 - L
-            FN -= L
-            TN -= 1 - L
-            yield TP, TN, FP, FN
+        If weights are given, TP and FP are the cumulative weights of the positives and negatives, and
+        inside a tie group they grow in proportion to the weight swept so far.
 
-        assert TN == 0
-        assert FN == 0
+        >>> Sweep.from_arrays([1, 1, 0], [1, 0, 1], weights=[3, 1, 2]).TP
+        array([0.  , 2.25, 3.  , 5.  ])
+        """
+        tie_mode = _tie_mode(tie_mode)
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(labels).ravel() != 0
+        assert scores.shape == labels.shape
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            assert weights.shape == scores.shape
+
+        if tie_mode == "sample":
+            order = np.lexsort((np.random.random(len(scores)), -scores))
+        else:
+            order = np.argsort(-scores, kind="mergesort")
+        scores = scores[order]
+        labels = labels[order]
+        weights = _take(weights, order)
+        if tie_mode == "smooth":
+            return Sweep._from_sorted(scores, labels, _mixed_ties(scores, labels), weights)
+        return Sweep._from_sorted(scores, labels, None, weights)
+
+    @staticmethod
+    def _from_sorted(scores, labels, ties=None, weights=None):
+        """Construct a sweep from scores already sorted in decreasing order and their boolean labels (and
+        optionally their weights). If the mixed tie groups (as returned by _mixed_ties) are given, they
+        are smoothed."""
+        n = len(scores)
+        TP = np.zeros(n + 1)
+        FP = np.zeros(n + 1)
+        if weights is None:
+            np.cumsum(labels, out=TP[1:])
+            FP[1:] = np.arange(1, n + 1) - TP[1:]
+        else:
+            np.cumsum(np.where(labels, weights, 0.0), out=TP[1:])
+            np.cumsum(np.where(labels, 0.0, weights), out=FP[1:])
+
+        if ties is not None and len(ties[0]):
+            starts, size, pos = ties
+            g = np.repeat(np.arange(len(starts)), size)
+            j = np.arange(1, len(g) + 1) - np.repeat(np.cumsum(size) - size, size)
+            a = starts[g]
+            m = size[g]
+            p = pos[g]
+            index = a + j
+            if weights is None:
+                # Numerators are exact integers, so each ratio is the correctly rounded fraction.
+                TP[index] = (TP[a] * m + p * j) / m
+                FP[index] = (FP[a] * m + (m - p) * j) / m
+            else:
+                W = np.r_[0.0, np.cumsum(weights)]
+                total = W[a + m] - W[a]
+                share = np.divide(W[index] - W[a], total, out=np.zeros(len(index)), where=total > 0)
+                TP[index], FP[index] = (
+                    TP[a] + share * (TP[a + m] - TP[a]),
+                    FP[a] + share * (FP[a + m] - FP[a]),
+                )
+        return Sweep(TP, FP)
+
+    @staticmethod
+    def from_tuples(sweep):
+        """Construct a sweep from any iterable which yields (TP, TN, FP, FN) tuples.
+
+        >>> Sweep.from_tuples([(0, 1, 0, 1), (1, 1, 0, 0), (1, 0, 1, 0)]).FP
+        array([0., 0., 1.])
+        """
+        rows = np.array(list(sweep), dtype=np.float64).reshape(-1, 4)
+        TP, TN, FP, FN = rows.T
+        return Sweep(TP, FP, TP[0] + FN[0], TN[0] + FP[0])
+
+    @property
+    def TN(self):
+        return self.num_neg - self.FP
+
+    @property
+    def FN(self):
+        return self.num_pos - self.TP
+
+    def __len__(self):
+        return len(self.TP)
+
+    def __iter__(self):
+        for TP, FP in zip(self.TP.tolist(), self.FP.tolist()):
+            TN = self.num_neg - FP
+            FN = self.num_pos - TP
+            if int(TP) == TP:
+                yield int(TP), int(TN), int(FP), int(FN)
+            else:
+                yield TP, TN, FP, FN
+
+
+def _take(values, order):
+    return None if values is None else values[order]
+
+
+def _as_sweep(sweep):
+    if isinstance(sweep, Sweep):
+        return sweep
+    return Sweep.from_tuples(sweep)
 
 
 def ROC(sweep):
@@ -292,12 +1976,8 @@ def ROC(sweep):
     >>> ROC(SD.sweep_threshold())
     Curve([(0.0, 0.0), (0.5, 0.0), (0.5, 0.5), (1.0, 0.5), (1.0, 1.0)])
     """
-    C = Curve()
-    for TP, TN, FP, FN in sweep:
-        TPR = float(TP) / (TP + FN)
-        FPR = float(FP) / (FP + TN)
-        C.append(FPR, TPR)
-    return C
+    S = _as_sweep(sweep)
+    return Curve.from_arrays(S.FP / S.num_neg, S.TP / S.num_pos)
 
 
 def SlantedAC(sweep):
@@ -307,49 +1987,166 @@ def SlantedAC(sweep):
     >>> SlantedAC(SD.sweep_threshold())
     Curve([(0.0, 0.0), (0.25, 0.0), (0.5, 0.5), (0.75, 0.5), (1.0, 1.0)])
     """
-    C = Curve()
-    for TP, TN, FP, FN in sweep:
-        TPR = float(TP) / (TP + FN)
-        F = float(FP + TP) / (FP + TN + TP + FN)
-        C.append(F, TPR)
-    return C
+    S = _as_sweep(sweep)
+    F = (S.FP + S.TP) / (S.num_pos + S.num_neg)
+    return Curve.from_arrays(F, S.TP / S.num_pos)
 
 
 def CeilingAC(sweep):
-    """Create a stepped AC curve."""
-    C = Curve()
-    lastTPR = lastF = 0
-    for TP, TN, FP, FN in sweep:
-        TPR = float(TP) / (TP + FN)
-        F = float(FP + TP) / (FP + TN + TP + FN)
-        C.append(lastF, TPR)
-        C.append(F, TPR)
-        lastTPR = TPR
-        lastF = F
-    return C
+    """Create a stepped AC curve.
+
+    >>> SD = ScoredData.from_ranks1([2,4],4)
+    >>> CeilingAC(SD.sweep_threshold())
+    Curve([(0.0, 0.0), (0.25, 0.0), (0.25, 0.5), (0.75, 0.5), (0.75, 1.0), (1.0, 1.0)])
+    """
+    S = _as_sweep(sweep)
+    F = (S.FP + S.TP) / (S.num_pos + S.num_neg)
+    TPR = S.TP / S.num_pos
+    x = np.empty(2 * len(F))
+    x[0] = 0
+    x[2::2] = F[:-1]
+    x[1::2] = F
+    return Curve.from_arrays(x, np.repeat(TPR, 2))
 
 
 def FloorAC(sweep):
-    """Create a stepped AC curve."""
-    C = Curve()
-    lastTPR = lastF = 0
-    for TP, TN, FP, FN in sweep:
-        TPR = float(TP) / (TP + FN)
-        F = float(FP + TP) / (FP + TN + TP + FN)
-        if F < 0:
-            continue
-        C.append(F, lastTPR)
-        C.append(F, TPR)
-        lastTPR = TPR
-        lastF = F
-    return C
+    """Create a stepped AC curve.
+
+    >>> SD = ScoredData.from_ranks1([2,4],4)
+    >>> FloorAC(SD.sweep_threshold())
+    Curve([(0.0, 0.0), (0.5, 0.0), (0.5, 0.5), (1.0, 0.5), (1.0, 1.0)])
+    """
+    S = _as_sweep(sweep)
+    F = (S.FP + S.TP) / (S.num_pos + S.num_neg)
+    TPR = S.TP / S.num_pos
+    y = np.empty(2 * len(TPR))
+    y[0] = 0
+    y[2::2] = TPR[:-1]
+    y[1::2] = TPR
+    return Curve.from_arrays(np.repeat(F, 2), y)
+
+
+_EXTREME_AREAS = {}
+
+
+def _extreme_area(num_pos, num_neg, curve, transform, best):
+    """The area under the best (or worst) curve of a given type. Because the positives form one block at
+    the top (or bottom) of the ranking, the step curve areas reduce to sums of the transform on a grid:
+
+    * CeilingAC: 1 - sum(T(k/N) for k in [a, a + P)) / P
+    * FloorAC:   1 - sum(T(k/N) for k in (a, a + P]) / P
+    * SlantedAC: the average of the two
+
+    where a is 0 for the best curve and the number of negatives for the worst curve. ROC curves always
+    have areas 1 and 0. Results are memoized on all the arguments.
+    """
+    if transform is None:
+        transform = Linear()
+    key = (num_pos, num_neg, curve, transform, best)
+    area = _EXTREME_AREAS.get(key)
+    if area is not None:
+        return area
+
+    P = num_pos
+    N = num_pos + num_neg
+    a = 0 if best else num_neg
+    if curve is ROC:
+        area = 1.0 if best else 0.0
+    elif curve is CeilingAC:
+        area = 1.0 - transform.grid_sum(a, P, N) / P
+    elif curve is FloorAC:
+        area = 1.0 - transform.grid_sum(a + 1, P, N) / P
+    elif curve is SlantedAC:
+        area = 1.0 - (transform.grid_sum(a, P, N) + transform.grid_sum(a + 1, P, N)) / (2.0 * P)
+    else:
+        raise ValueError("curve must be ROC, SlantedAC, CeilingAC or FloorAC.")
+
+    if len(_EXTREME_AREAS) >= 10000:
+        _EXTREME_AREAS.clear()
+    _EXTREME_AREAS[key] = area
+    return area
+
+
+class _Buffer(object):
+    """A growable, contiguous NumPy array which supports amortized constant time appends. The
+    valid portion of the buffer is exposed (without copying) by the view method.
+
+    >>> B = _Buffer()
+    >>> B.append(1)
+    >>> B.extend([2, 3])
+    >>> B.view()
+    array([1., 2., 3.])
+    """
+
+    def __init__(self, dtype=np.float64, data=None):
+        self._data = np.empty(16, dtype=dtype)
+        self._n = 0
+        if data is not None:
+            self.assign(data)
+
+    def __len__(self):
+        return self._n
+
+    def _reserve(self, n):
+        if n > len(self._data):
+            data = np.empty(max(n, 2 * len(self._data)), dtype=self._data.dtype)
+            data[: self._n] = self._data[: self._n]
+            self._data = data
+
+    def append(self, value):
+        self._reserve(self._n + 1)
+        self._data[self._n] = value
+        self._n += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+        self._reserve(self._n + len(values))
+        self._data[self._n : self._n + len(values)] = values
+        self._n += len(values)
+
+    def assign(self, values):
+        """Replace the contents of the buffer with the values of an array (which is not copied)."""
+        self._data = np.asarray(values, dtype=self._data.dtype).ravel()
+        self._n = len(self._data)
+
+    def truncate(self, n):
+        assert 0 <= n <= self._n
+        self._n = n
+
+    def view(self):
+        return self._data[: self._n]
+
+
+def _prune_coordinates(x, y):
+    """Vectorized equivalent of calling Curve.append on every coordinate, in order. Monotonicity is
+    checked, consecutive duplicates are dropped, and interior vertically or horizontally colinear
+    points are removed. Returns the pruned x and y arrays.
+    """
+    assert x.shape == y.shape and x.ndim == 1
+    if len(x) >= 2:
+        assert np.all(x[1:] >= x[:-1] - 0.000001)  # assert that x monotonically increases.
+        assert np.all(y[1:] >= y[:-1] - 0.000001)  # assert that y monotonically increases.
+        keep = np.ones(len(x), dtype=bool)
+        keep[1:] = (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+        x = x[keep]
+        y = y[keep]
+    if len(x) >= 3:
+        same_x = x[1:] == x[:-1]
+        same_y = y[1:] == y[:-1]
+        keep = np.ones(len(x), dtype=bool)
+        keep[1:-1] = ~((same_x[:-1] & same_x[1:]) | (same_y[:-1] & same_y[1:]))
+        x = x[keep]
+        y = y[keep]
+    return x, y
 
 
 class Curve(object):
-    """A class that encodes, left to right, a monotonically increasing parametric curve."""
+    """A class that encodes, left to right, a monotonically increasing parametric curve. The
+    coordinates are stored in two contiguous float64 NumPy arrays, which are accessible as the x and
+    y attributes."""
 
     @staticmethod
-    def average(curves):
+    def average(curves, grid=None):
         """
         A static function which vertically averages a list of curves. For example:
 
@@ -357,7 +2154,18 @@ class Curve(object):
         >>> C2 = Curve([(0,0), (0,1), (1,1)])
         >>> Curve.average([C1,C2])
         Curve([(0.0, 0.0), (0.0, 0.5), (1.0, 1.0)])
+
+        If a grid of x coordinates is given, the curves are resampled on it (see Curve.resample) and
+        averaged with a CurveAccumulator, so the result has at most two coordinates per grid point no
+        matter how many curves are averaged.
+
+        >>> Curve.average([C1,C2], grid=[0, 0.5, 1])
+        Curve([(0.0, 0.0), (0.0, 0.5), (0.5, 0.75), (1.0, 1.0)])
         """
+        if grid is not None:
+            A = CurveAccumulator(grid)
+            A.extend(curves)
+            return A.average()
         return Curve.sum(curves).vertical_scale(1 / float(len(curves)))
 
     @staticmethod
@@ -369,8 +2177,81 @@ class Curve(object):
         >>> C2 = Curve([(0,0), (0,1), (1,1)])
         >>> Curve.sum([C1,C2])
         Curve([(0.0, 0.0), (0.0, 1.0), (1.0, 2.0)])
+
+        All the curves are merged at once, without evaluating any curve away from its own breakpoints.
+        Each curve is described by events at its breakpoints: the height of its vertical step there, and
+        the change of its slope. The events of all the curves are merged with one stable sort, which
+        merges the k sorted runs in O(n log k) time for n breakpoints in total, and the sum follows from
+        cumulative sums of the steps and of the slopes times the widths of the merged intervals. These
+        sums are accumulated in extended precision (where the platform has it), so they round to the same
+        coordinates as adding the curves directly. At an x coordinate where a curve has a vertical step,
+        both the bottom and the top of the step are kept, so the sum has the same vertical steps as
+        adding the curves one pair at a time.
+
+        >>> C = Curve([(0, 0), (0.2, 0.2), (0.4, 0.2), (0.4, 0.8), (1, 1)])
+        >>> Curve.sum([C, C, C]).vertical_scale(1 / 3.0) == C
+        True
         """
-        return reduce(lambda A, B: A + B, curves)
+        curves = list(curves)
+        for C in curves[1:]:
+            assert C[0][0] == curves[0][0][0]
+            assert C[-1][0] == curves[0][-1][0]
+
+        u, jumps, slopes, starts = zip(*[C._events() for C in curves])
+        u = np.concatenate(u)
+        order = np.argsort(u, kind="stable")
+        u = u[order]
+        first = np.flatnonzero(np.r_[True, u[1:] != u[:-1]])
+        X = u[first]
+        jump = np.maximum(np.add.reduceat(np.concatenate(jumps)[order], first), 0)
+        # The curves never decrease, so a negative slope can only be rounding residue, and is clipped.
+        slope = np.maximum(np.cumsum(np.add.reduceat(np.concatenate(slopes)[order], first)), 0)
+        rise = np.cumsum(slope[:-1] * np.diff(X.astype(np.longdouble)))
+        top = np.sum(np.array(starts, dtype=np.longdouble)) + np.cumsum(jump)
+        top[1:] += rise
+        bottom = top - jump
+        y = np.column_stack((bottom, top)).ravel().astype(np.float64)
+        return Curve.from_arrays(np.repeat(X, 2), y)
+
+    def _events(self):
+        """The unique x coordinates of this curve, the height of its vertical step and the change of its
+        slope at each of them, and its first y coordinate."""
+        x = self.x
+        y = self.y
+        step = x[1:] == x[:-1]
+        u = x[np.r_[True, ~step]]
+        bottom = y[np.r_[True, ~step]]
+        top = y[np.r_[~step, True]]
+        bottom = bottom.astype(np.longdouble)
+        top = top.astype(np.longdouble)
+        slope = (bottom[1:] - top[:-1]) / np.diff(u.astype(np.longdouble))
+        zero = np.zeros(1, dtype=np.longdouble)
+        return u, top - bottom, np.diff(np.concatenate((zero, slope, zero))), y[0]
+
+    def _interpolate(self, X):
+        """Evaluate this curve at the sorted x coordinates X, which must lie within its range. Returns
+        the y coordinates at the bottom and at the top of each x coordinate, which only differ where the
+        curve has a vertical step."""
+        x = self.x
+        y = self.y
+        step = x[1:] == x[:-1]
+        u = x[np.r_[True, ~step]]
+        bottom = y[np.r_[True, ~step]]
+        top = y[np.r_[~step, True]]
+
+        i = np.minimum(np.searchsorted(u, X), len(u) - 1)
+        exact = u[i] == X
+        lower = bottom[i]
+        upper = top[i]
+        j = np.flatnonzero(~exact)
+        if len(j):
+            x1 = u[i[j]]
+            y1 = bottom[i[j]]
+            x0 = u[i[j] - 1]
+            y0 = top[i[j] - 1]
+            t = X[j]
+            lower[j] = upper[j] = ((x1 - t) * y0 + (t - x0) * y1) / (x1 - x0)
+        return lower, upper
 
     def __eq__(self, other):
         """
@@ -387,6 +2268,8 @@ class Curve(object):
         >>> Curve([(0,0), (1, 1)]) == [(0,0), (1, 1)]
         1
         """
+        if isinstance(other, Curve):
+            return bool(np.array_equal(self.x, other.x) and np.array_equal(self.y, other.y))
         return list(self).__eq__(list(other))
 
     def write_to_file(self, file):
@@ -403,10 +2286,28 @@ class Curve(object):
         >>> Curve.read_from_file(file)
         Curve([(0.0, 0.0), (0.0, 1.0), (1.0, 1.0)])
         """
+        data = _read_columns(file, 2, "expected an x and a y coordinate")
+        return Curve.from_arrays(data[:, 0], data[:, 1])
+
+    @staticmethod
+    def from_arrays(x, y):
+        """An alternate constructor which builds a curve in bulk from arrays of x and y coordinates. The
+        result is identical to appending each coordinate in turn, but the monotonicity checks and the
+        removal of duplicate and colinear points are vectorized.
+
+        >>> Curve.from_arrays([0, 0, 0, 0.5, 1], [0, 0.5, 1, 1, 1])
+        Curve([(0.0, 0.0), (0.0, 1.0), (1.0, 1.0)])
+        >>> Curve.from_arrays([0, 1], [1, 0])
+        Traceback (most recent call last):
+            ...
+        AssertionError
+        """
+        x = np.array(x, dtype=np.float64).ravel()
+        y = np.array(y, dtype=np.float64).ravel()
+        x, y = _prune_coordinates(x, y)
         C = Curve()
-        for L in file:
-            x, y = L.split()
-            C.append(x, y)
+        C._x.assign(x)
+        C._y.assign(y)
         return C
 
     def __init__(self, coords=[]):
@@ -436,9 +2337,26 @@ class Curve(object):
         >>> C is D
         0
         """
-        self._coord = []
-        for x, y in coords:
-            self.append(x, y)
+        self._x = _Buffer()
+        self._y = _Buffer()
+        if isinstance(coords, Curve):
+            self._x.assign(coords.x.copy())
+            self._y.assign(coords.y.copy())
+            return
+        coords = np.array(list(coords), dtype=np.float64).reshape(-1, 2)
+        x, y = _prune_coordinates(coords[:, 0].copy(), coords[:, 1].copy())
+        self._x.assign(x)
+        self._y.assign(y)
+
+    @property
+    def x(self):
+        """The x coordinates of this curve as a float64 array. The array is a view, and should not be modified."""
+        return self._x.view()
+
+    @property
+    def y(self):
+        """The y coordinates of this curve as a float64 array. The array is a view, and should not be modified."""
+        return self._y.view()
 
     def append(self, x, y):
         """Append an x,y coordinate pair to this curve performing basic error checking to ensure
@@ -504,7 +2422,8 @@ class Curve(object):
                 del self[-1]  # eliminate horizontal colinear point
             elif (self[-2][1] == self[-1][1]) and (self[-1][1] == y):
                 del self[-1]  # eliminate vertical colinear point
-        self._coord.append((x, y))
+        self._x.append(x)
+        self._y.append(y)
 
     def __delitem__(self, i):
         """Delete a the i-th coordinate
@@ -515,7 +2434,15 @@ class Curve(object):
         Curve([(0.0, 0.0)])
 
         """
-        del self._coord[i]
+        n = len(self)
+        if i == -1 or i == n - 1:
+            self._x.truncate(n - 1)
+            self._y.truncate(n - 1)
+            return
+        keep = np.ones(n, dtype=bool)
+        keep[i] = False
+        self._x.assign(self.x[keep])
+        self._y.assign(self.y[keep])
 
     def __getitem__(self, i):
         """Return the i-th coordinate
@@ -524,7 +2451,9 @@ class Curve(object):
         >>> C[0]
         (0.0, 0.0)
         """
-        return self._coord[i]
+        if isinstance(i, slice):
+            return list(zip(self.x[i].tolist(), self.y[i].tolist()))
+        return float(self.x[i]), float(self.y[i])
 
     def __iter__(self):
         """Coordinates of a curve can be iterated over:
@@ -535,10 +2464,10 @@ class Curve(object):
         0.0 0.0
         1.0 1.0
         """
-        return iter(self._coord)
+        return iter(self[:])
 
     def __str__(self):
-        return str(self._coord)
+        return str(self[:])
 
     def __len__(self):
         """The number of coordinates of a curve is accessed using the len function.
@@ -547,12 +2476,12 @@ class Curve(object):
         >>> len(C)
         2
         """
-        return len(self._coord)
+        return len(self._x)
 
     def __repr__(self):
-        return "Curve(" + repr(self._coord) + ")"
+        return "Curve(" + repr(self[:]) + ")"
 
-    def area(self):
+    def area(self, transform=None):
         """Integrate along the coordinates of a curve using the trapezoid rule.
 
         Here are some examples:
@@ -563,14 +2492,24 @@ class Curve(object):
         0.0
         >>> Curve( [(0,0), (0,1), (1,1)] ).area()
         1.0
+
+        If a transform is given, the area under the transformed curve is computed from the transformed
+        x coordinates, without building the transformed curve. Like every other area in this package
+        (such as the best and worst areas, and the random and bootstrapped areas), slanted segments are
+        integrated along their chords in the transformed coordinates, so the result is the same as
+        transforming the curve first. Step curves (CeilingAC and FloorAC) have no slanted segments, so
+        their transformed areas are exact.
+
+        >>> C = SlantedAC(ScoredData.from_ranks1([2, 4], 4).sweep_threshold())
+        >>> T = Exponential(20)
+        >>> C.area(T) == C.transform(T).area()
+        True
         """
-        area = 0.0
-        last_x, last_y = self._coord[0]
-        for x, y in self._coord:
-            area += (y + last_y) * (x - last_x) / 2.0
-            last_x = x
-            last_y = y
-        return area
+        x = self.x
+        y = self.y
+        if transform is not None:
+            x = _apply(transform, x)
+        return float(np.dot(y[1:] + y[:-1], x[1:] - x[:-1])) / 2.0
 
     def __add__(self, other):
         """
@@ -627,54 +2566,32 @@ class Curve(object):
         >>> (C2 + C3).area()
         1.0
         """
-        assert self[0][0] == other[0][0]
-        assert self[-1][0] == other[-1][0]
-
-        c1 = list(self)
-        c2 = list(other)
-        C = Curve()
-
-        last_p1 = c1.pop(0)
-        last_p2 = c2.pop(0)
-        C.append(last_p1[0], last_p1[1] + last_p2[1])
-
-        while c1 or c2:
-            if not c1:
-                for p in c2:  # add rest of c2
-                    C.append(p[0], p[1] + last_p1[1])
-                    last_p2 = p
-                break
-            if not c2:
-                for p in c1:  # add rest of c1
-                    C.append(p[0], p[1] + last_p2[1])
-                    last_p1 = p
-                break
-
-            x = min(c1[0][0], c2[0][0])
-
-            if c1[0][0] == x:
-                p1 = c1.pop(0)
-            else:
-                p1 = (
-                    x,
-                    ((c1[0][0] - x) * last_p1[1] + (x - last_p1[0]) * c1[0][1])
-                    / (c1[0][0] - last_p1[0]),
-                )
-
-            if c2[0][0] == x:
-                p2 = c2.pop(0)
-            else:
-                p2 = (
-                    x,
-                    ((c2[0][0] - x) * last_p2[1] + (x - last_p2[0]) * c2[0][1])
-                    / (c2[0][0] - last_p2[0]),
-                )
+        return Curve.sum([self, other])
+
+    def resample(self, grid):
+        """Return a new curve with coordinates only at the x coordinates of a sorted grid, which must lie
+        within the range of this curve. Between breakpoints, the curve is linearly interpolated, and
+        where it has a vertical step at a grid point, both the bottom and the top of the step are kept.
+
+        >>> C = Curve([(0, 0), (0.25, 0), (0.25, 0.5), (1, 1)])
+        >>> C.resample([0, 0.25, 0.5, 1])
+        Curve([(0.0, 0.0), (0.25, 0.0), (0.25, 0.5), (0.5, 0.6666666666666666), (1.0, 1.0)])
+        >>> C.resample([0, 0.5, 1])
+        Curve([(0.0, 0.0), (0.5, 0.6666666666666666), (1.0, 1.0)])
+        """
+        X = _check_grid(grid, self)
+        bottom, top = self._interpolate(X)
+        return Curve.from_arrays(np.repeat(X, 2), np.column_stack((bottom, top)).ravel())
 
-            C.append(x, p1[1] + p2[1])
+    def on_grid(self, n_points, spacing="linear", decades=3):
+        """Resample this curve on a grid of n_points x coordinates spanning its range, which are either
+        evenly spaced or (with spacing="log") logarithmically spaced over a number of decades. See
+        curve_grid for details.
 
-            last_p1 = p1
-            last_p2 = p2
-        return C
+        >>> Curve([(0, 0), (1, 1)]).on_grid(3)
+        Curve([(0.0, 0.0), (0.5, 0.5), (1.0, 1.0)])
+        """
+        return self.resample(curve_grid(n_points, spacing, self.x[0], self.x[-1], decades))
 
     def vertical_scale(self, scale):
         """Return a new Curve object that has y values shrunk or expanded by a given scale factor.
@@ -688,15 +2605,185 @@ class Curve(object):
         return self.transform(lambda x: x * scale, "y")
 
     def transform(self, transform, axis="x"):
-        """Return a new curve with the x or y coordinates transformed"""
+        """Return a new curve with the x or y coordinates transformed. The transform is applied to the
+        whole coordinate array at once, falling back to one call per coordinate for callables which
+        only accept scalars.
+
+        >>> Curve([(0, 0), (0.5, 1), (1, 1)]).transform(lambda x: x ** 2)
+        Curve([(0.0, 0.0), (0.25, 1.0), (1.0, 1.0)])
+        """
         if axis == "x":
-            return Curve([(transform(x), y) for x, y in self])
+            return Curve.from_arrays(_apply(transform, self.x), self.y)
         elif axis == "y":
-            return Curve([(x, transform(y)) for x, y in self])
+            return Curve.from_arrays(self.x, _apply(transform, self.y))
         else:
             raise ValueError("axis must be 'x' or 'y'")
 
 
+def curve_grid(n_points, spacing="linear", start=0.0, end=1.0, decades=3):
+    """Return n_points sorted x coordinates from start to end, to resample curves on. With linear
+    spacing, the points are evenly spaced. With log spacing, the first point is start and the others
+    are spaced evenly on a log scale, from 10 ** -decades of the range to the end. The log spacing
+    keeps resolution on the early part of a curve, which matters for early recognition.
+
+    >>> curve_grid(5)
+    array([0.  , 0.25, 0.5 , 0.75, 1.  ])
+    >>> curve_grid(4, "log", decades=2)
+    array([0.  , 0.01, 0.1 , 1.  ])
+    """
+    assert n_points >= 2
+    assert end > start
+    if spacing == "linear":
+        return np.linspace(start, end, n_points)
+    elif spacing == "log":
+        assert decades > 0
+        offsets = np.logspace(-decades, 0, n_points - 1) * (end - start)
+        out = np.r_[start, start + offsets]
+        out[-1] = end
+        return out
+    raise ValueError("spacing must be 'linear' or 'log'")
+
+
+def _check_grid(grid, curve=None):
+    grid = np.array(grid, dtype=np.float64).ravel()
+    assert len(grid) >= 1
+    assert np.all(grid[1:] > grid[:-1])  # assert that the grid strictly increases.
+    if curve is not None:
+        assert grid[0] >= curve.x[0] and grid[-1] <= curve.x[-1]
+    return grid
+
+
+class CurveAccumulator(object):
+    """Vertically averages a stream of curves, which are added one at a time or in batches, without
+    keeping them all in memory.
+
+    Without a grid, only the running vertical sum of the curves is kept, and the average is exact (the
+    same as Curve.average). With a grid of x coordinates, the curves are resampled on it (see
+    Curve.resample) and only the sums of the bottom and top y coordinates at each grid point are stored,
+    so the memory used does not grow with the number of curves. Curves are resampled in batches,
+    stacked as rows of an array and summed along its first axis.
+
+    >>> A = CurveAccumulator([0, 0.5, 1])
+    >>> A.add(Curve([(0, 0), (1, 1)]))
+    >>> A.add(Curve([(0, 0), (0, 1), (1, 1)]))
+    >>> A.count
+    2
+    >>> A.average()
+    Curve([(0.0, 0.0), (0.0, 0.5), (0.5, 0.75), (1.0, 1.0)])
+
+    On a grid, the pointwise variance of the curves can also be tracked, by passing variance=True. It
+    is updated batch by batch with the pairwise algorithm of Chan et al., which avoids the cancellation
+    of a running sum of squares. The variance of the running sum is not defined without a grid, because
+    the x coordinates of the sum change as curves are added.
+
+    >>> A = CurveAccumulator([0, 0.5, 1], variance=True)
+    >>> A.extend([Curve([(0, 0), (1, 1)]), Curve([(0, 0), (0, 1), (1, 1)])])
+    >>> A.variance()
+    (array([0.   , 0.125, 0.   ]), array([0.5  , 0.125, 0.   ]))
+    """
+
+    def __init__(self, grid=None, variance=False, batch_size=1 << 22):
+        if grid is None and variance:
+            raise ValueError("the pointwise variance can only be tracked on a grid.")
+        self.grid = None if grid is None else _check_grid(grid)
+        self.batch_size = batch_size
+        self.count = 0
+        self._sum = None
+        self._mean = None
+        self._m2 = None
+        if self.grid is not None:
+            self._sum = np.zeros((2, len(self.grid)))
+            if variance:
+                self._mean = np.zeros((2, len(self.grid)))
+                self._m2 = np.zeros((2, len(self.grid)))
+
+    def add(self, curve):
+        """Add one curve to the accumulator."""
+        self.extend([curve])
+
+    def extend(self, curves):
+        """Add several curves to the accumulator. Only one batch of curves is held at a time, so curves
+        can be streamed from a generator."""
+        batch = []
+        size = 0
+        for C in curves:
+            if self.grid is not None:
+                assert C.x[0] <= self.grid[0] and C.x[-1] >= self.grid[-1]
+                batch.append(C._interpolate(self.grid))
+                size += len(self.grid)
+            else:
+                batch.append(C)
+                size += len(C)
+            if size >= self.batch_size:
+                self._flush(batch)
+                batch = []
+                size = 0
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        k = len(batch)
+        if self.grid is None:
+            self._sum = Curve.sum(batch if self._sum is None else [self._sum] + batch)
+            self.count += k
+            return
+
+        values = np.array(batch)  # shape (curves, 2, grid points)
+        self._sum += values.sum(axis=0)
+        if self._m2 is not None:
+            mean = values.mean(axis=0)
+            delta = mean - self._mean
+            n = self.count + k
+            self._mean += delta * k / n
+            self._m2 += ((values - mean) ** 2).sum(axis=0) + delta ** 2 * self.count * k / n
+        self.count += k
+
+    def sum(self):
+        """The vertical sum of all the added curves."""
+        assert self.count >= 1
+        if self.grid is None:
+            return Curve(self._sum)
+        y = self._sum.T.ravel()
+        return Curve.from_arrays(np.repeat(self.grid, 2), y)
+
+    def average(self):
+        """The vertical average of all the added curves."""
+        return self.sum().vertical_scale(1 / float(self.count))
+
+    def variance(self):
+        """The unbiased variance of the curves at the bottom and top of each grid point, as two arrays."""
+        if self._m2 is None:
+            raise ValueError("this accumulator does not track the variance.")
+        assert self.count >= 2
+        out = self._m2 / (self.count - 1)
+        return out[0], out[1]
+
+
+def _apply(function, values):
+    """Apply a function to every element of a float64 array. Functions are first called with the whole
+    array, and are only called once per element if they cannot handle arrays.
+    """
+    try:
+        out = np.asarray(function(values), dtype=np.float64)
+        if out.shape == values.shape:
+            return out
+    except (TypeError, ValueError, AssertionError):
+        pass
+    return np.array([function(v) for v in values.tolist()], dtype=np.float64)
+
+
+def _unit_interval(x):
+    """Convert x to a float64 array, checking once that all of it lies in [0,1]."""
+    x = np.asarray(x, dtype=np.float64)
+    assert np.all((x >= 0.0) & (x <= 1.0))
+    return x
+
+
+def _unwrap(out):
+    """Return 0-d arrays as floats, so that transforms of scalars are scalars."""
+    return float(out) if out.ndim == 0 else out
+
+
 class Transform(object):
     """The interface which all x-axis transforms should implement. The __call__ method
     should expect as map the input in the range [0,1] to the output domain [0,1] with
@@ -713,24 +2800,53 @@ class Transform(object):
         self.alpha = alpha
 
     def __call__(self, x):
+        """Transforms map a number, or an array of numbers, from [0,1] to [0,1]. Subclasses should accept
+        NumPy arrays and return floats for scalar input, which _unit_interval and _unwrap help with."""
         raise NotImplementedError
 
+    def _key(self):
+        return type(self), getattr(self, "alpha", None)
+
+    def __eq__(self, other):
+        """Transforms are equal if they are of the same type and have the same parameter.
+
+        >>> Exponential(20) == Exponential(20.0), Exponential(20) == Power(20)
+        (True, False)
+        """
+        return isinstance(other, Transform) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def grid_sum(self, first, count, N):
+        """Sum the transform over the grid k / N, for the count integers k starting at first.
+
+        >>> round(Logarithm(10).grid_sum(0, 5, 4), 10) == round(sum(Logarithm(10)(k / 4.0) for k in range(5)), 10)
+        True
+        """
+        return float(np.sum(_apply(self, np.arange(first, first + count) / float(N))))
+
 
 class Logarithm(Transform):
     """
     This class encodes the logarithmic transform computed as: f(x) = log(1 + x * alpha)/log(1 + alpha)
     """
 
+    def __init__(self, alpha):
+        Transform.__init__(self, alpha)
+        self._norm = math.log1p(alpha)
+
     def __call__(self, x):
         """
         >>> Logarithm(10)(1)
         1.0
         >>> Logarithm(100)(0)
         0.0
+        >>> Logarithm(1)(np.array([0, 0.5, 1]))
+        array([0.       , 0.5849625, 1.       ])
         """
-        assert x <= 1.0
-        assert x >= 0.0
-        return math.log(1.0 + x * self.alpha) / math.log(1.0 + self.alpha)
+        x = _unit_interval(x)
+        return _unwrap(np.log1p(x * self.alpha) / self._norm)
 
 
 class Exponential(Transform):
@@ -738,17 +2854,38 @@ class Exponential(Transform):
     f(x) = (1 - exp(-alpha * x)) / (1 - exp(-alpha))
     """
 
+    def __init__(self, alpha):
+        Transform.__init__(self, alpha)
+        self._norm = math.expm1(-alpha)
+
     def __call__(self, x):
         """
         >>> Exponential(10)(1)
         1.0
         >>> Exponential(100)(0)
         0.0
+
+        Arrays are transformed at once, and the range of the whole array is checked.
+
+        >>> Exponential(1e-9)(np.array([0.25, 0.5]))
+        array([0.25, 0.5 ])
+        >>> Exponential(20)(np.array([0.5, 1.5]))
+        Traceback (most recent call last):
+            ...
+        AssertionError
         """
+        x = _unit_interval(x)
+        return _unwrap(np.expm1(-self.alpha * x) / self._norm)
 
-        assert x <= 1.0
-        assert x >= 0.0
-        return (1.0 - math.exp(-self.alpha * x)) / (1.0 - math.exp(-self.alpha))
+    def grid_sum(self, first, count, N):
+        """Sum the transform over a grid in closed form, using the geometric series of exp(-alpha * k / N).
+
+        >>> round(Exponential(20).grid_sum(3, 4, 10), 10) == round(sum(Exponential(20)(k / 10.0) for k in range(3, 7)), 10)
+        True
+        """
+        a = float(self.alpha)
+        geometric = math.exp(-a * first / N) * math.expm1(-a * count / N) / math.expm1(-a / N)
+        return (count - geometric) / -math.expm1(-a)
 
 
 class Power(Transform):
@@ -756,10 +2893,13 @@ class Power(Transform):
     f(x) = x ^ (1/(1 + alpha))
     """
 
+    def __init__(self, alpha):
+        Transform.__init__(self, alpha)
+        self._exponent = 1.0 / (1.0 + alpha)
+
     def __call__(self, x):
-        assert x <= 1.0
-        assert x >= 0.0
-        return x ** (1.0 / (1.0 + self.alpha))
+        x = _unit_interval(x)
+        return _unwrap(x ** self._exponent)
 
 
 class Linear(Transform):
@@ -767,10 +2907,102 @@ class Linear(Transform):
         pass
 
     def __call__(self, x):
-        assert x <= 1.0
-        assert x >= 0.0
+        x = _unit_interval(x)
+        return _unwrap(x.copy())
+
+    def grid_sum(self, first, count, N):
+        return (count * first + count * (count - 1) / 2.0) / N
+
+
+class Composition(Transform):
+    """The composition of several transforms, which are applied in order. Its parameter is the tuple of
+    transforms.
+
+    >>> T = Composition((Power(1), Exponential(20)))
+    >>> T(0.25) == Exponential(20)(0.5)
+    True
+    """
+
+    def __init__(self, transforms):
+        self.alpha = tuple(transforms)
+        assert len(self.alpha) >= 1
+
+    def __call__(self, x):
+        for T in self.alpha:
+            x = T(x)
         return x
 
+    def _key(self):
+        return type(self), tuple(T._key() for T in self.alpha)
+
+
+_TRANSFORM_TYPES = {
+    "linear": Linear,
+    "logarithm": Logarithm,
+    "exponential": Exponential,
+    "power": Power,
+}
+
+_TRANSFORMS = {}
+_INTERNED_TRANSFORMS = {}
+
+
+def parse_transform(spec):
+    """Parse a transform specification without evaluating any code. A specification names a transform
+    and its parameter, separated by a colon, like "exponential:20", "logarithm:100", "power:0.5" or
+    "linear". Several transforms separated by "|" are composed, in order. The constructor syntax of
+    earlier versions, like "Exponential(20)" or "Linear()", is also accepted. Names are not case sensitive.
+
+    Parsed transforms are interned: the same specification (up to white space, case and syntax) always
+    returns the same object, so the memoized best and worst areas are shared by all its uses.
+
+    >>> parse_transform("exponential:20")(0.5) == Exponential(20)(0.5)
+    True
+    >>> parse_transform("Exponential(20)") is parse_transform(" EXPONENTIAL : 20 ")
+    True
+    >>> parse_transform("power:1 | exponential:20") == Composition((Power(1), Exponential(20)))
+    True
+    >>> parse_transform("__import__('os')")
+    Traceback (most recent call last):
+        ...
+    ValueError: invalid transform specification: "__import__('os')"
+    """
+    key = "".join(spec.split()).lower()
+    T = _TRANSFORMS.get(key)
+    if T is not None:
+        return T
+
+    parts = []
+    for part in key.split("|"):
+        if part.endswith(")") and "(" in part:
+            name, _, parameter = part[:-1].partition("(")
+        else:
+            name, _, parameter = part.partition(":")
+        cls = _TRANSFORM_TYPES.get(name)
+        try:
+            if cls is None:
+                raise ValueError
+            if cls is Linear:
+                if parameter:
+                    raise ValueError
+                parts.append(Linear())
+            else:
+                alpha = float(parameter)
+                if not alpha > 0:
+                    raise ValueError
+                parts.append(cls(alpha))
+        except ValueError:
+            raise ValueError("invalid transform specification: %s" % repr(str(spec)))
+
+    T = parts[0] if len(parts) == 1 else Composition(parts)
+    if len(_TRANSFORMS) >= 10000:
+        _TRANSFORMS.clear()
+        _INTERNED_TRANSFORMS.clear()
+    # Equal transforms parsed from different spellings share one instance.
+    T = _INTERNED_TRANSFORMS.setdefault(T, T)
+    _TRANSFORMS[key] = T
+    return T
+
 
 def main():
     import doctest
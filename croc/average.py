@@ -8,11 +8,34 @@ from future import standard_library
 standard_library.install_aliases()
 import optparse
 import sys
-from croc import Curve
+from croc import Curve, CurveAccumulator, curve_grid
 
 
 def main(argv):
     parser = optparse.OptionParser("%prog [options] in1.curve in2.curve > ave.curve")
+    parser.add_option(
+        "-g",
+        "--grid",
+        type="int",
+        dest="grid",
+        help="resample the averaged curve on a grid with this number of x coordinates (Default is to keep every coordinate of the input curves)",
+        default=None,
+    )
+    parser.add_option(
+        "--spacing",
+        type="str",
+        dest="spacing",
+        help="spacing of the grid {linear,log} (Default=linear)",
+        default="linear",
+    )
+    parser.add_option(
+        "-v",
+        "--variance",
+        type="str",
+        dest="variance_file",
+        help="file to store the pointwise variance of the curves on the grid (requires -g)",
+        default=None,
+    )
 
     (options, args) = parser.parse_args(argv)
 
@@ -20,8 +43,28 @@ def main(argv):
         parser.print_help()
         sys.exit()
 
-    curves = [Curve.read_from_file(open(FILE, "r")) for FILE in args]
-    Curve.average(curves).write_to_file(sys.stdout)
+    assert options.spacing in ["linear", "log"]
+    if options.variance_file and not options.grid:
+        parser.error("the variance can only be computed on a grid (-g)")
+
+    # The files are read one at a time, so only one input curve is held in memory.
+    curves = (Curve.read_from_file(open(FILE, "r")) for FILE in args)
+    first = next(curves)
+    grid = None
+    if options.grid:
+        grid = curve_grid(options.grid, options.spacing, first.x[0], first.x[-1])
+    A = CurveAccumulator(grid, variance=bool(options.variance_file), batch_size=0)
+    A.add(first)
+    A.extend(curves)
+    A.average().write_to_file(sys.stdout)
+
+    if options.variance_file:
+        file = open(options.variance_file, "w")
+        bottom, top = A.variance()
+        for x, b, t in zip(A.grid.tolist(), bottom.tolist(), top.tolist()):
+            print(x, b, file=file)
+            if t != b:
+                print(x, t, file=file)
 
 
 if __name__ == "__main__":
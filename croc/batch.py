@@ -0,0 +1,304 @@
+#!/usr/bin/python
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+from builtins import open
+from future import standard_library
+standard_library.install_aliases()
+import glob
+import multiprocessing
+import optparse
+import sys
+from croc import (
+    BEDROC,
+    EarlyRecognition,
+    ROC,
+    SlantedAC,
+    CeilingAC,
+    FloorAC,
+    GroupedScoredData,
+    Linear,
+    ScoredData,
+    parse_transform,
+)
+
+CURVES = {
+    "roc": ROC,
+    "ac": SlantedAC,
+    "slantedac": SlantedAC,
+    "ceilingac": CeilingAC,
+    "floorac": FloorAC,
+}
+
+
+def evaluate(path, file_format, curve_types, transform, alphas, fractions=()):
+    """Read one dataset and return its row of the output table (see evaluate_data). The data is read once.
+    """
+    if file_format == "r0":
+        S = ScoredData.read_from_file_ranks0(path)
+    elif file_format == "r1":
+        S = ScoredData.read_from_file_ranks1(path)
+    else:
+        S = ScoredData.read_from_file(path)
+    return evaluate_data(S, curve_types, transform, alphas, fractions)
+
+
+def evaluate_data(S, curve_types, transform, alphas, fractions=()):
+    """Return the row of the output table for one ScoredData: the area under each curve type (with the
+    transform applied), the BEDROC score for each alpha and, if fractions are given, the enrichment
+    factors and ROC enrichments at each fraction followed by the pROC AUC.
+
+    >>> from croc import Linear
+    >>> S = ScoredData.from_ranks1([1, 3, 4, 5, 8], 10)
+    >>> [round(x, 6) for x in evaluate_data(S, ["roc", "ac"], Linear(), [20.0], [0.1])]
+    [0.76, 0.63, 0.88297, 2.0, 2.0, 0.603546]
+    """
+    row = []
+    if curve_types:
+        sweep = S.sweep_threshold()
+        for curve_type in curve_types:
+            row.append(CURVES[curve_type](sweep).transform(transform).area())
+    if alphas:
+        row.extend(out["BEDROC"] for out in BEDROC(S, alphas, curves=False))
+    if fractions:
+        out = EarlyRecognition(S, fractions)
+        row.extend(out["EF"][f] for f in fractions)
+        row.extend(out["ROC_enrichment"][f] for f in fractions)
+        row.append(out["pROC_AUC"])
+    return row
+
+
+def evaluate_groups(G, curve_types, transform, alphas, fractions=(), workers=1, executor=None):
+    """Return the rows of the output table (see evaluate_data) for every group of a GroupedScoredData, in
+    the order of its keys. The ROC AUC (without a transform) and the BEDROC scores of all the groups are
+    computed together with its segment operations. Only the other columns are computed group by group,
+    spread over the workers, in a pool of processes of their own unless an executor is given. Groups
+    without both positives and negatives get nan.
+
+    >>> G = GroupedScoredData.from_arrays(["a", "a", "a", "b", "b"], [0.9, 0.5, 0.1, 0.8, 0.2], [1, 0, 1, 0, 0])
+    >>> rows = evaluate_groups(G, ["roc", "ac"], Linear(), [20.0])
+    >>> [round(x, 6) for x in rows[0]], rows[1]
+    ([0.5, 0.5, 0.998729], [nan, nan, nan])
+    """
+    linear = transform == Linear()
+    auc = G.roc_auc() if linear and "roc" in curve_types else {}
+    bedrocs = [G.bedroc(alpha) for alpha in alphas]
+    others = [c for c in curve_types if not (linear and c == "roc")]
+
+    valid = [(G.num_pos[i] > 0 and G.num_neg[i] > 0) for i in range(len(G))]
+    rest = {}
+    if others or fractions:
+        groups = [(key, S) for (key, S), ok in zip(G, valid) if ok]
+        tasks = [(S, others, transform, (), fractions) for key, S in groups]
+        rest = dict(zip([key for key, S in groups], map_tasks(_evaluate_data, tasks, workers, executor)))
+
+    nan = float("nan")
+    rows = []
+    for key, ok in zip(G.keys, valid):
+        values = rest.get(key, [])
+        if isinstance(values, Exception) or not ok:
+            values = [nan] * width(others, (), fractions)
+        values = list(values)
+        row = [auc[key] if linear and c == "roc" else values.pop(0) for c in curve_types]
+        row.extend(out[key] for out in bedrocs)
+        row.extend(values)
+        rows.append(row)
+    return rows
+
+
+def width(curve_types, alphas, fractions):
+    """The number of columns of a row of the output table, besides its labels."""
+    return len(curve_types) + len(alphas) + (2 * len(fractions) + 1 if fractions else 0)
+
+
+def _evaluate(args):
+    # A dataset which cannot be read or evaluated is reported as its error, so the rest of the batch is kept.
+    try:
+        return evaluate(*args)
+    except Exception as error:
+        return error
+
+
+def _evaluate_data(args):
+    try:
+        return evaluate_data(*args)
+    except Exception as error:
+        return error
+
+
+def main(argv):
+    parser = optparse.OptionParser(
+        "%prog [options] input1.scoreddata input2.scoreddata ... > output.table"
+    )
+    parser.add_option(
+        "-f",
+        "--file_list",
+        type="str",
+        dest="file_list",
+        help="a file listing the input files, one per line, in addition to those given as arguments.",
+        default=None,
+    )
+    parser.add_option(
+        "-c",
+        "--curve_types",
+        type="str",
+        dest="curve_types",
+        help="comma separated curve types whose areas are computed {roc,ac,slantedac,ceilingac,floorac} (DEFAULT=roc).",
+        default="roc",
+    )
+    parser.add_option(
+        "-t",
+        "--transform",
+        type="str",
+        dest="transform",
+        help="the transform applied to the x-axis of the curves, like exponential:20, logarithm:100, power:0.5 or linear, with several transforms composed by '|' (DEFAULT = linear).",
+        default="linear",
+    )
+    parser.add_option(
+        "-a",
+        "--alpha",
+        type="str",
+        dest="alpha",
+        help="comma separated alphas for which BEDROC is computed (DEFAULT is not to compute BEDROC).",
+        default="",
+    )
+    parser.add_option(
+        "-e",
+        "--enrichment",
+        type="str",
+        dest="fractions",
+        help="comma separated fractions at which the enrichment factor and ROC enrichment are computed, along with the pROC AUC (DEFAULT is not to compute them).",
+        default="",
+    )
+    parser.add_option(
+        "-j",
+        "--workers",
+        type=int,
+        dest="workers",
+        help="the number of worker processes (DEFAULT is the number of processors).",
+        default=None,
+    )
+    parser.add_option(
+        "-g",
+        "--grouped",
+        action="store_true",
+        dest="grouped",
+        help="Inputs are tables of (group, score, label) rows, and each group is evaluated separately, with the groups spread over the workers.",
+    )
+    parser.add_option(
+        "--r0",
+        action="store_true",
+        dest="r0",
+        help="Inputs are rank files, indexed from 0 (Default is Scored-Label format).",
+    )
+    parser.add_option(
+        "--r1",
+        action="store_true",
+        dest="r1",
+        help="Inputs are rank files, indexed from 1 (Default is Scored-Label format).",
+    )
+
+    (options, args) = parser.parse_args(argv)
+
+    assert not (options.r0 and options.r1)
+    assert not (options.grouped and (options.r0 or options.r1))
+    curve_types = [c for c in options.curve_types.split(",") if c]
+    for curve_type in curve_types:
+        assert curve_type in CURVES
+    alphas = [float(alpha) for alpha in options.alpha.split(",") if alpha]
+    for alpha in alphas:
+        assert alpha > 0
+    fractions = [float(f) for f in options.fractions.split(",") if f]
+    for f in fractions:
+        assert 0 < f <= 1
+    transform = parse_transform(options.transform)
+    file_format = "r0" if options.r0 else "r1" if options.r1 else "scoreddata"
+
+    # Arguments may be glob patterns, which are expanded here so they can be quoted on the command line.
+    paths = []
+    for pattern in args:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    if options.file_list:
+        paths.extend(line.strip() for line in open(options.file_list) if line.strip())
+
+    if len(paths) == 0:
+        parser.print_help()
+        sys.exit()
+
+    print(
+        "\t".join(
+            ["file"]
+            + (["group"] if options.grouped else [])
+            + [curve_type + "_area" for curve_type in curve_types]
+            + ["BEDROC_" + str(alpha) for alpha in alphas]
+            + ["EF_" + str(f) for f in fractions]
+            + ["ROC_enrichment_" + str(f) for f in fractions]
+            + (["pROC_AUC"] if fractions else [])
+        )
+    )
+
+    workers = options.workers or multiprocessing.cpu_count()
+    if not options.grouped:
+        workers = min(workers, len(paths))
+    columns = width(curve_types, alphas, fractions)
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # One pool of workers is started for the whole batch and reused by every dataset and group.
+        executor = ProcessPoolExecutor(workers)
+    try:
+        if options.grouped:
+            # Each table is read and sorted once, and its groups are evaluated together.
+            for path in paths:
+                try:
+                    G = GroupedScoredData.read_from_file(path)
+                except Exception as error:
+                    write_rows([[path, ""]], [error], columns)
+                    continue
+                rows = evaluate_groups(G, curve_types, transform, alphas, fractions, workers, executor)
+                write_rows([[path, str(key)] for key in G.keys], rows, columns)
+        else:
+            tasks = [(path, file_format, curve_types, transform, alphas, fractions) for path in paths]
+            rows = map_tasks(_evaluate, tasks, workers, executor)
+            write_rows([[path] for path in paths], rows, columns)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def map_tasks(function, tasks, workers, executor=None):
+    """Yield the results of a function applied to each task, in order, over a pool of workers. If an
+    executor (with that many workers) is given, it is used instead of starting a new pool, so the same
+    workers can serve many calls."""
+    if workers == 1 or len(tasks) <= 1:
+        for result in map(function, tasks):
+            yield result
+        return
+    # Tasks are handed out in chunks to amortize the messaging.
+    chunksize = max(1, len(tasks) // (4 * workers))
+    if executor is not None:
+        for result in executor.map(function, tasks, chunksize=chunksize):
+            yield result
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(min(workers, len(tasks))) as executor:
+        for result in executor.map(function, tasks, chunksize=chunksize):
+            yield result
+
+
+def write_rows(labels, rows, columns):
+    """Write the rows of the output table. Datasets which failed get a row of nan, and their errors are
+    reported on stderr."""
+    for label, row in zip(labels, rows):
+        if isinstance(row, Exception):
+            print("%s: %s: %s" % (" ".join(x for x in label if x), type(row).__name__, row), file=sys.stderr)
+            row = [float("nan")] * columns
+        print("\t".join(label + [str(x) for x in row]))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
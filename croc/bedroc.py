@@ -8,7 +8,7 @@ from future import standard_library
 standard_library.install_aliases()
 import optparse
 import sys
-from croc import SampleCurves, BEDROC, CeilingAC, Curve, ScoredData, Exponential
+from croc import SampleRandomCurves, RandomCurve, BootstrapBEDROC, confidence_interval, TopRanked, BEDROC, CeilingAC, Curve, ScoredData, Exponential
 
 
 def main(argv):
@@ -18,10 +18,10 @@ def main(argv):
     parser.add_option(
         "-a",
         "--alpha",
-        type="float",
+        type="str",
         dest="alpha",
-        help="The alpha used to parameterize the BEDROC curve (DEFAULT=20.0)",
-        default=20.0,
+        help="The alpha used to parameterize the BEDROC curve, or a comma separated list of alphas which are evaluated together and reported as a table with one row per alpha on stdout (DEFAULT=20.0)",
+        default="20.0",
     )
     parser.add_option(
         "-b",
@@ -51,31 +51,100 @@ def main(argv):
         "-s",
         type="int",
         dest="samples",
-        help="the number of times to sample the random curve (Default=500)",
+        help="the number of times to sample the random curve, with --sample_random (Default=500)",
         default=500,
     )
+    parser.add_option(
+        "--sample_random",
+        action="store_true",
+        dest="sample_random",
+        help="Estimate the random curve by sampling instead of computing it exactly.",
+    )
+    parser.add_option(
+        "--bootstrap",
+        type=int,
+        dest="bootstrap",
+        help="the number of bootstrap resamples used to compute a 95% confidence interval (DEFAULT is not to compute it)",
+        default=0,
+    )
+    parser.add_option(
+        "-k",
+        "--top",
+        type=int,
+        dest="top",
+        help="stream the input and only keep its top scores, reporting lower and upper bounds of BEDROC (DEFAULT is to keep all the data)",
+        default=0,
+    )
+
+    parser.add_option(
+        "--weighted",
+        action="store_true",
+        dest="weighted",
+        help="Input has a third column with the weight of each instance. BEDROC takes each instance as one step as wide as its weight, so integer weights do not give the same score as repeating each line by its weight.",
+    )
 
     (options, args) = parser.parse_args(argv)
 
-    assert options.alpha > 0
+    alphas = [float(alpha) for alpha in options.alpha.split(",")]
+    for alpha in alphas:
+        assert alpha > 0
+
+    if options.top:
+        if options.best_file or options.worst_file or options.random_file or options.bootstrap or options.weighted:
+            parser.error("curves, bootstrap intervals and weights are not available with --top")
+        T = TopRanked.read_from_file(sys.stdin, options.top)
+        print("alpha\tBEDROC_lower\tBEDROC_upper")
+        for alpha in alphas:
+            low, high = T.bedroc(alpha)
+            print("\t".join(str(x) for x in (alpha, low, high)))
+        return
+
+    if options.weighted and (options.random_file or options.bootstrap):
+        parser.error("random curves and bootstrap intervals are not available with --weighted")
+
+    if len(alphas) > 1:
+        if options.best_file or options.worst_file or options.random_file:
+            parser.error("curve files can only be written for a single alpha")
+        S = ScoredData.read_from_file(sys.stdin, options.weighted)
+        print("alpha\tarea\tbest_area\tworst_area\tBEDROC")
+        for alpha, RESULTS in zip(alphas, BEDROC(S, alphas, curves=False)):
+            print(
+                "\t".join(
+                    str(x)
+                    for x in (
+                        alpha,
+                        RESULTS["area"],
+                        RESULTS["max_area"],
+                        RESULTS["min_area"],
+                        RESULTS["BEDROC"],
+                    )
+                )
+            )
+        return
 
-    S = ScoredData.read_from_file(sys.stdin)
-    F = lambda sweep: CeilingAC(sweep).transform(Exponential(options.alpha))
+    options.alpha = alphas[0]
+    S = ScoredData.read_from_file(sys.stdin, options.weighted)
 
-    RESULTS = BEDROC(S, options.alpha)
+    RESULTS = BEDROC(
+        S, options.alpha, curves=bool(options.best_file or options.worst_file)
+    )
 
     area = RESULTS["area"]
-    curve = RESULTS["curve"]
     Barea = RESULTS["max_area"]
-    Bcurve = RESULTS["max_curve"]
+    Bcurve = RESULTS.get("max_curve")
     Warea = RESULTS["min_area"]
-    Wcurve = RESULTS["min_curve"]
+    Wcurve = RESULTS.get("min_curve")
     bedroc = RESULTS["BEDROC"]
 
     print("Area Under Curve = ", area, file=sys.stderr)
     print("Area Under Best Curve = ", Barea, file=sys.stderr)
     print("Area Under Worst Curve = ", Warea, file=sys.stderr)
     print("BEDROC = ", bedroc, file=sys.stderr)
+    if options.bootstrap:
+        low, high = confidence_interval(
+            BootstrapBEDROC(S, options.alpha, options.bootstrap)
+        )
+        print("BEDROC (95% bootstrap interval) = ", low, high, file=sys.stderr)
 
     if options.best_file:
         file = open(options.best_file, "w")
@@ -85,9 +154,25 @@ def main(argv):
         file = open(options.worst_file, "w")
         Wcurve.write_to_file(file)
 
-    if options.random_file:
-        curve, average, std_deviation = SampleCurves(
-            lambda: F(S.sweep_threshold_random()), options.samples
+    if options.random_file and not options.sample_random:
+        curve, average, variance = RandomCurve(S, CeilingAC, Exponential(options.alpha))
+        file = open(options.random_file, "w")
+        curve.write_to_file(file)
+        print("Area Under Random Curve (average) = ", average, file=sys.stderr)
+        print("Area Under Random Curve (variance) = ", variance, file=sys.stderr)
+        print(
+            "Random BEDROC (average) = ",
+            (average - Warea) / (Barea - Warea),
+            file=sys.stderr,
+        )
+        print(
+            "Random BEDROC (variance) = ",
+            variance / (Barea - Warea) ** 2,
+            file=sys.stderr,
+        )
+    elif options.random_file:
+        curve, average, std_deviation = SampleRandomCurves(
+            S, CeilingAC, Exponential(options.alpha), options.samples
         )
         file = open(options.random_file, "w")
         curve.write_to_file(file)
@@ -10,16 +10,17 @@ import optparse
 import sys
 from croc import (
     SampleCurves,
+    SampleRandomCurves,
+    RandomCurve,
+    BootstrapAreas,
+    confidence_interval,
     ROC,
     SlantedAC,
     CeilingAC,
     FloorAC,
     Curve,
     ScoredData,
-    Linear,
-    Exponential,
-    Logarithm,
-    Power,
+    parse_transform,
 )
 
 
@@ -48,8 +49,8 @@ def main(argv):
         "--transform",
         type="str",
         dest="transform",
-        help="a python code snipit which evals to a Transform object (DEFAULT = Linear()) typical constructors include Linear, Power, Logarithm, and Exponential.",
-        default="Linear()",
+        help="the transform applied to the x-axis, like exponential:20, logarithm:100, power:0.5 or linear, with several transforms composed by '|' (DEFAULT = linear).",
+        default="linear",
     )
     parser.add_option(
         "-b",
@@ -80,9 +81,28 @@ def main(argv):
         "--samples",
         type=int,
         dest="samples",
-        help="the number of times to sample ties (with 'sample' tie-mode) and the random curve (Default=500)",
+        help="the number of times to sample ties (with 'sample' tie-mode) and the random curve (with --sample_random) (Default=500)",
         default=500,
     )
+    parser.add_option(
+        "--sample_random",
+        action="store_true",
+        dest="sample_random",
+        help="Estimate the random curve by sampling instead of computing it exactly.",
+    )
+    parser.add_option(
+        "--bootstrap",
+        type=int,
+        dest="bootstrap",
+        help="the number of bootstrap resamples used to compute a 95% confidence interval (DEFAULT is not to compute it)",
+        default=0,
+    )
+    parser.add_option(
+        "--weighted",
+        action="store_true",
+        dest="weighted",
+        help="Input has a third column with the weight of each instance. ROC and slanted AC curves match repeating each line by its weight; the stepped AC curves take each instance as one step as wide as its weight, so they do not.",
+    )
     parser.add_option(
         "--r0",
         action="store_true",
@@ -102,8 +122,11 @@ def main(argv):
     assert options.curve_type in ["roc", "slantedac", "ceilingac", "floorac", "ac"]
     assert options.transform != None
     assert not (options.r0 and options.r1)
+    assert not (options.weighted and (options.r0 or options.r1))
+    if options.weighted and (options.random_file or options.bootstrap):
+        parser.error("random curves and bootstrap intervals are not available with --weighted")
 
-    options.transform = eval(options.transform)
+    options.transform = parse_transform(options.transform)
 
     rS = ScoredData.read_from_file
     if options.r0:
@@ -111,7 +134,10 @@ def main(argv):
     if options.r1:
         rS = ScoredData.read_from_file_ranks1
 
-    S = rS(sys.stdin)
+    if options.weighted:
+        S = rS(sys.stdin, weighted=True)
+    else:
+        S = rS(sys.stdin)
 
     if options.curve_type == "roc":
         M = ROC
@@ -143,6 +169,12 @@ def main(argv):
         C.write_to_file(sys.stdout)
         print("Area Under Curve = ", C.area(), file=sys.stderr)
 
+    if options.bootstrap:
+        low, high = confidence_interval(
+            BootstrapAreas(S, M, options.transform, options.bootstrap)
+        )
+        print("Area Under Curve (95% bootstrap interval) = ", low, high, file=sys.stderr)
+
     if options.best_file:
         file = open(options.best_file, "w")
         C = F(S.sweep_threshold_best())
@@ -155,9 +187,15 @@ def main(argv):
         C.write_to_file(file)
         print("Area Under Worst Curve = ", C.area(), file=sys.stderr)
 
-    if options.random_file:
-        curve, average, std_deviation = SampleCurves(
-            lambda: F(S.sweep_threshold_random()), options.samples
+    if options.random_file and not options.sample_random:
+        curve, average, variance = RandomCurve(S, M, options.transform)
+        file = open(options.random_file, "w")
+        curve.write_to_file(file)
+        print("Area Under Random Curve (average) = ", average, file=sys.stderr)
+        print("Area Under Random Curve (variance) = ", variance, file=sys.stderr)
+    elif options.random_file:
+        curve, average, std_deviation = SampleRandomCurves(
+            S, M, options.transform, options.samples
         )
         std_error = std_deviation / (options.samples**0.5)
 
@@ -41,7 +41,7 @@ Citation
 Description
 -----------
 
-This pure-python package is designed to be a standardized implementation of performance curves
+This python package is designed to be a standardized implementation of performance curves
 and metrics for use either in python scripts or through a simple commandline interface. As a standardized implementation
 its output is robust enough to be using in publishable scientific work.
 
@@ -59,14 +59,14 @@ the most common functions.
     author="S. Joshua Swamidass",
     url="http://swami.wustl.edu/CROC",
     author_email="swamidass@gmail.com",
-    install_requires=["future"],
+    python_requires=">=3.9",
+    install_requires=["future", "numpy"],
     classifiers=["Development Status :: 5 - Production/Stable",
         "License :: OSI Approved :: MIT License",
         "Intended Audience :: Science/Research",
         "License :: Free for non-commercial use",
         "Natural Language :: English",
         "Environment :: Console",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
         "Topic :: Scientific/Engineering",
@@ -77,6 +77,6 @@ the most common functions.
         "Topic :: Scientific/Engineering :: Mathematics",
         "Topic :: Scientific/Engineering :: Medical Science Apps.",
         "Topic :: Scientific/Engineering :: Visualization"],
-    scripts=['scripts/croc-average', 'scripts/croc-bedroc', 'scripts/croc-area', 'scripts/croc-curve'],
+    scripts=['scripts/croc-average', 'scripts/croc-bedroc', 'scripts/croc-area', 'scripts/croc-curve', 'scripts/croc-batch'],
     packages=['croc']
 )